@@ -5,19 +5,25 @@ from __future__ import unicode_literals
 
 __author__ = 'Florian Strzelecki <florian.strzelecki@gmail.com>'
 __version__ = '0.5.3'
-__all__ = ['opf', 'ncx', 'utils']
+__all__ = ['opf', 'ncx', 'utils', 'batch', 'cache', 'pool', 'stats',
+           'tracing']
 
 
+import copy
+import io
+import mmap
 import os
-import shutil
-import tempfile
+import struct
+import sys
+import threading
 import uuid
 import warnings
 import zipfile
+import zlib
 
 from xml.dom import minidom
 
-from . import ncx, opf, utils
+from . import ncx, opf, stats, tracing, utils
 
 
 MIMETYPE_EPUB = 'application/epub+zip'
@@ -27,6 +33,14 @@ MIMETYPE_NCX = 'application/x-dtbncx+xml'
 DEFAULT_OPF_PATH = 'OEBPS/content.opf'
 DEFAULT_NCX_PATH = 'toc.ncx'
 
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# zipfile.ZipFile.open can write a member since Python 3.6
+ZIPFILE_OPEN_WRITE = sys.version_info >= (3, 6)
+
+# mmap.mmap supports the buffer protocol (and so memoryview) since Python 3
+MMAP_MEMORYVIEW = sys.version_info >= (3,)
+
 
 def open(filename, mode=None):
     """Open an epub file and return an EpubFile object"""
@@ -35,14 +49,324 @@ def open(filename, mode=None):
     return open_epub(filename, mode)
 
 
-def open_epub(filename, mode=None):
-    return EpubFile(filename, mode)
+def open_epub(filename, mode=None, lazy_toc=False, cache=None,
+              use_mmap=False, manifest_class=None, stats=None, tracer=None,
+              concurrent_reads=False):
+    return EpubFile(filename, mode, lazy_toc, cache, use_mmap, manifest_class,
+                    stats, tracer, concurrent_reads)
+
+
+def open_epub_metadata(filename):
+    """Read only the OPF metadata of an epub file and return an EpubMetadata.
+    """
+    return EpubMetadata(filename)
+
+
+def _read_opf_path(archive):
+    """Return the OPF file path given by META-INF/container.xml."""
+    xmlstring = archive.read('META-INF/container.xml')
+    container_xml = minidom.parseString(xmlstring).documentElement
+
+    for element in container_xml.getElementsByTagName('rootfile'):
+        if element.getAttribute('media-type') == MIMETYPE_OPF:
+            # Only take the first full-path available
+            return element.getAttribute('full-path')
+    return None
+
+
+def _find_uid(opf_object):
+    """Return the identifier tuple referenced as unique-identifier."""
+    uids = [x for x in opf_object.metadata.identifiers
+                  if x[1] == opf_object.uid_id]
+    if uids:
+        return uids[0]
+    warnings.warn('The ePub does not define any uid', SyntaxWarning)
+    return None
+
+
+def _count_toc_nodes(toc):
+    """Return the count of navPoint, pageTarget and navTarget of an Ncx."""
+    count = len(toc.page_list.page_target)
+    for nav_list in toc.nav_lists:
+        count += len(nav_list.nav_target)
+    stack = list(toc.nav_map.nav_point)
+    while stack:
+        count += 1
+        stack.extend(stack.pop().nav_point)
+    return count
+
+
+def _copy_bytes(source_fp, source_offset, target_fp, target_offset, size):
+    """Copy `size` bytes from a file object to another one, by chunks.
+
+    Both file objects can be the same one, if target is before source.
+
+    """
+    while size > 0:
+        source_fp.seek(source_offset)
+        data = source_fp.read(min(size, COPY_BUFFER_SIZE))
+        if not data:
+            raise BadEpubFile('Truncated member at offset %d.' % source_offset)
+        target_fp.seek(target_offset)
+        target_fp.write(data)
+        source_offset += len(data)
+        target_offset += len(data)
+        size -= len(data)
+
+
+def _iter_chunks(source, chunk_size=COPY_BUFFER_SIZE):
+    """Iterate over the content of `source` as bytes chunks.
+
+    `source` can be bytes (or any buffer), a binary file-like object, which is
+    read `chunk_size` bytes at a time, or an iterable of bytes chunks.
+
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield source
+    elif hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        for chunk in source:
+            yield chunk
+
+
+def _strip_zip64_extra(extra):
+    """Remove the zip64 field from the extra data of a member."""
+    stripped = b''
+    index = 0
+    while index + 4 <= len(extra):
+        header_id, size = struct.unpack('<HH', extra[index:index + 4])
+        if header_id != 1:
+            stripped += extra[index:index + 4 + size]
+        index += 4 + size
+    return stripped
+
+
+def _member_data_offset(fp, info):
+    """Return the offset of the payload of member `info` in the archive `fp`.
+
+    The payload starts after the local header, whose name and extra field
+    may differ from the central directory: the local header is read from the
+    archive file object `fp`.
+
+    """
+    fp.seek(info.header_offset)
+    return _data_offset(info, fp.read(zipfile.sizeFileHeader))
+
+
+def _data_offset(info, header):
+    """Return the offset of the payload of member `info`, given the bytes of
+    its local header."""
+    if len(header) != zipfile.sizeFileHeader or \
+       header[0:4] != zipfile.stringFileHeader:
+        raise BadEpubFile('Bad local header for member %s.' % info.filename)
+    header = struct.unpack(zipfile.structFileHeader, header)
+    return (info.header_offset + zipfile.sizeFileHeader +
+            header[zipfile._FH_FILENAME_LENGTH] +
+            header[zipfile._FH_EXTRA_FIELD_LENGTH])
+
+
+def _is_stored(info):
+    """Tell if the payload of a member is its content: neither compressed
+    nor encrypted."""
+    return info.compress_type == zipfile.ZIP_STORED and \
+        not info.flag_bits & 0x01
+
+
+def _copy_raw_member(source, target, info, arcname=None):
+    """Copy a member from a zip archive to another one, without recompression.
+
+    The compressed payload of `info` is copied verbatim from `source` after a
+    new local header, at the end of `target`. CRC, sizes and compression
+    method are kept. Both source and target are zipfile.ZipFile objects, and
+    must be two different archives. Return the ZipInfo of the new member.
+
+    """
+    if source.fp is target.fp:
+        raise ValueError('Can not copy a member inside the same archive.')
+
+    data_offset = _member_data_offset(source.fp, info)
+
+    new_info = copy.copy(info)
+    if arcname:
+        new_info.filename = new_info.orig_filename = arcname
+    # CRC and sizes are known: write them in the local header instead of a
+    # data descriptor after the payload.
+    new_info.flag_bits &= ~0x08
+    new_info.extra = _strip_zip64_extra(info.extra)
+    zip64 = (info.file_size > zipfile.ZIP64_LIMIT or
+             info.compress_size > zipfile.ZIP64_LIMIT)
+
+    # zipfile.ZipFile has no lock of its own before Python 3.5
+    with getattr(target, '_lock', None) or threading.RLock():
+        if getattr(target, '_writing', False):
+            raise ValueError('Can\'t write to the ZIP file while there is '
+                             'an open writing handle.')
+        # Python 2 zipfile.ZipFile writes the next member where its file is,
+        # and has no start_dir in `w` mode (nor updates it in `a` mode).
+        if sys.version_info < (3,):
+            header_offset = target.fp.tell()
+        else:
+            header_offset = target.start_dir
+        target.fp.seek(header_offset)
+        new_info.header_offset = header_offset
+        local_header = new_info.FileHeader(zip64)
+        target.fp.write(local_header)
+        data_start = header_offset + len(local_header)
+        _copy_bytes(source.fp, data_offset, target.fp, data_start,
+                    info.compress_size)
+        target.fp.seek(data_start + info.compress_size)
+        if sys.version_info >= (3,):
+            target.start_dir = data_start + info.compress_size
+
+        target.filelist.append(new_info)
+        target.NameToInfo[new_info.filename] = new_info
+        target._didModify = True
+    return new_info
 
 
 class BadEpubFile(zipfile.BadZipfile):
     pass
 
 
+def _is_buffer(source):
+    """Tell if `source` is the content of an epub file rather than its path.
+
+    bytearray and memoryview are contents; so are bytes, except with Python 2
+    where they are the usual type of paths.
+
+    """
+    if isinstance(source, (bytearray, memoryview)):
+        return True
+    if MMAP_MEMORYVIEW and isinstance(source, mmap.mmap):
+        return True
+    return bytes is not str and isinstance(source, bytes)
+
+
+class _BufferFile(io.RawIOBase):
+    """Read-only, seekable binary file object over a buffer (eg. an mmap).
+
+    zipfile.ZipFile reads its central directory and members through it, and
+    `view` gives a memoryview of the buffer without any copy.
+
+    """
+
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer)
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += len(self.buffer)
+        if offset < 0:
+            raise ValueError('Negative seek position %d.' % offset)
+        self.position = offset
+        return offset
+
+    def read(self, size=-1):
+        end = len(self.buffer)
+        if size is not None and size >= 0:
+            end = min(end, self.position + size)
+        data = self.buffer[self.position:end].tobytes()
+        self.position = max(self.position, end)
+        return data
+
+    def readinto(self, target):
+        data = self.read(len(target))
+        target[:len(data)] = data
+        return len(data)
+
+    def view(self, offset, size):
+        return self.buffer[offset:offset + size]
+
+    def read_at(self, offset, size):
+        """Return `size` bytes from `offset`, without moving the position."""
+        return self.buffer[offset:offset + size].tobytes()
+
+
+class _PositionalReader(object):
+    """Read an epub file at given offsets, from many threads at once.
+
+    Reads do not share any file position, so they need no lock: with
+    os.pread (Unix), every thread reads the same file descriptor; otherwise,
+    each thread opens its own file object.
+
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._fd = None
+        self._files = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if hasattr(os, 'pread'):
+            self._fd = os.open(filename, os.O_RDONLY)
+
+    def read_at(self, offset, size):
+        """Return `size` bytes from `offset` (fewer at the end of file)."""
+        if self._fd is None:
+            return self._thread_file().read_at(offset, size)
+        data = os.pread(self._fd, size, offset)
+        if len(data) == size or not data:
+            return data
+        # pread may return fewer bytes than asked: read the rest
+        chunks = [data]
+        while size > len(data):
+            offset += len(data)
+            size -= len(data)
+            data = os.pread(self._fd, size, offset)
+            if not data:
+                break
+            chunks.append(data)
+        return b''.join(chunks)
+
+    def _thread_file(self):
+        thread_file = getattr(self._local, 'file', None)
+        if thread_file is None:
+            thread_file = self._local.file = _ThreadFile(self.filename)
+            with self._lock:
+                self._files.append(thread_file)
+        return thread_file
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        with self._lock:
+            files, self._files = self._files, []
+        for thread_file in files:
+            thread_file.close()
+
+
+class _ThreadFile(object):
+    """File object of a single thread, for a _PositionalReader."""
+
+    def __init__(self, filename):
+        self.fp = io.open(filename, 'rb')
+
+    def read_at(self, offset, size):
+        self.fp.seek(offset)
+        return self.fp.read(size)
+
+    def close(self):
+        self.fp.close()
+
+
 class EpubFile(zipfile.ZipFile):
     """Represent an epub zip file, as described in version 2.0.1 of epub spec.
 
@@ -63,25 +387,138 @@ class EpubFile(zipfile.ZipFile):
         """
         return os.path.dirname(self.opf_path).replace('\\', '/')
 
-    def __init__(self, filename, mode=None):
+    @property
+    def toc(self):
+        """Return the Ncx object of the epub.
+
+        When the epub is opened with `lazy_toc`, the NCX file is read and
+        parsed only the first time this property is used, so it must be used
+        before the epub is closed. It is parsed once, under the archive lock,
+        even when several threads use this property at the same time.
+
+        """
+        if self._toc_item is not None:
+            with self._lock:
+                # Another thread may have parsed it in the meantime
+                item = self._toc_item
+                if item is not None:
+                    self._toc = self._parse_toc(item)
+                    self._toc_item = None
+        return self._toc
+
+    @toc.setter
+    def toc(self, value):
+        self._toc_item = None
+        self._toc = value
+
+    def __init__(self, filename, mode=None, lazy_toc=False, cache=None,
+                 use_mmap=False, manifest_class=None, stats=None,
+                 tracer=None, concurrent_reads=False):
         """Open the Epub zip file with mode read "r", write "w" or append "a".
+
+        With `lazy_toc`, the NCX file is not parsed when the epub is opened,
+        but the first time the `toc` attribute is used.
+
+        With a `cache` (see `epub.cache.ParseCache`), parsed OPF and NCX are
+        stored when an epub is read for the first time, and reused when the
+        same archive is opened again. A lazy toc is not deferred when a new
+        entry is stored.
+
+        With `use_mmap` (read mode only, Python 3), the epub file is
+        memory-mapped once and every read is made in the mapped memory: see
+        `read_item_view`.
+
+        Instead of a path, `filename` can be the content of an epub file, as
+        bytes (Python 3), bytearray or memoryview, opened in read mode only.
+        The content is not copied: items are read from it as from a mapped
+        file.
+
+        The manifest of the epub is a `manifest_class` object: by default an
+        `epub.opf.Manifest`, or an `epub.opf.ColumnarManifest` for very large
+        manifests.
+
+        With `stats` (see `epub.stats.EpubStats`), the time and size of each
+        stage of the epub file are recorded: `central_directory`, `cache`,
+        `container`, `opf`, `ncx`, `read_item` and `write_close`.
+
+        Spans are reported to `tracer` (see `epub.tracing`), or to the tracer
+        set with `epub.tracing.set_tracer` by default.
+
+        With `concurrent_reads` (read mode only), `read_item` and
+        `read_item_range` read the archive at given offsets, without its lock
+        (os.pread, or a file object per thread), so that threads read and
+        decompress items in parallel.
+
         """
         mode = mode or 'r'
-        zipfile.ZipFile.__init__(self, filename, mode)
-        self.uid = None
-        self.opf_path = None
-        self.opf = None
-        self.toc = None
+        if concurrent_reads and mode != 'r':
+            raise ValueError('Concurrent reads need the read-only mode.')
+        if concurrent_reads and hasattr(filename, 'read'):
+            raise ValueError('Concurrent reads need a path or a buffer, '
+                             'not a file object.')
+        self._reader = None
+        self._data_offsets = {}
+        self.stats = stats
+        self.tracer = tracer if tracer is not None else tracing.get_tracer()
+        self._cache_hit = None
+        self._mmap = None
+        self._buffer_file = None
+        attributes = {'epub.mode': mode}
+        if not _is_buffer(filename) and not hasattr(filename, 'read'):
+            attributes['epub.filename'] = '%s' % filename
+        with self.tracer.span('open book', attributes) as span:
+            with self._stage('central_directory') as stage:
+                if _is_buffer(filename):
+                    if mode != 'r':
+                        raise ValueError(
+                            'Epub files read from memory are read-only.')
+                    self._buffer_file = _BufferFile(filename)
+                    zipfile.ZipFile.__init__(self, self._buffer_file, mode)
+                elif use_mmap:
+                    if mode != 'r':
+                        raise ValueError(
+                            'Memory-mapped epub files are read-only.')
+                    if not MMAP_MEMORYVIEW:
+                        raise ValueError(
+                            'Memory-mapped epub files need Python 3.')
+                    with io.open(filename, 'rb') as f:
+                        self._mmap = mmap.mmap(f.fileno(), 0,
+                                               access=mmap.ACCESS_READ)
+                    self._buffer_file = _BufferFile(self._mmap)
+                    zipfile.ZipFile.__init__(self, self._buffer_file, mode)
+                    self.filename = filename
+                else:
+                    zipfile.ZipFile.__init__(self, filename, mode)
+                stage.add(elements=len(self.filelist))
+            if not hasattr(self, '_lock'):
+                # zipfile.ZipFile has no lock of its own before Python 3.5
+                self._lock = threading.RLock()
+            if concurrent_reads:
+                if self._buffer_file is not None:
+                    self._reader = self._buffer_file
+                else:
+                    self._reader = _PositionalReader(filename)
+            self.lazy_toc = lazy_toc
+            self.cache = cache
+            self.manifest_class = manifest_class or opf.Manifest
+            self.uid = None
+            self.opf_path = None
+            self.opf = None
+            self.toc = None
 
-        if self.mode == 'r':
-            self._init_read()
-        elif self.mode == 'w':
-            self._init_new()
-        elif self.mode == 'a':
-            if len(self.namelist()) == 0:
-                self._init_new()
-            else:
+            if self.mode == 'r':
                 self._init_read()
+            elif self.mode == 'w':
+                self._init_new()
+            elif self.mode == 'a':
+                if len(self.namelist()) == 0:
+                    self._init_new()
+                else:
+                    self._init_read()
+            span.set_attribute('epub.members', len(self.filelist))
+            if self._cache_hit is not None:
+                span.set_attribute('epub.cache',
+                                   'hit' if self._cache_hit else 'miss')
 
     def _init_new(self):
         """Build an empty epub archive."""
@@ -95,7 +532,7 @@ class EpubFile(zipfile.ZipFile):
         # Create metadata, manifest, and spine, as minimalist as possible
         metadata = opf.Metadata()
         metadata.add_identifier(self.uid, uid_id, 'uid')
-        manifest = opf.Manifest()
+        manifest = self.manifest_class()
         manifest.add_item('ncx', 'toc.ncx', MIMETYPE_NCX)
         spine = opf.Spine('ncx')
         # Create Opf object
@@ -107,64 +544,202 @@ class EpubFile(zipfile.ZipFile):
 
     def _init_read(self):
         """Get content from existing epub file"""
-        # Read container.xml to get OPF xml file path
-        xmlstring = self.read('META-INF/container.xml')
-        container_xml = minidom.parseString(xmlstring).documentElement
+        cache_key = None
+        if self.cache is not None:
+            with self._stage('cache') as stage:
+                cache_key = self.cache.fingerprint(self)
+                cached = self.cache.get(cache_key)
+                self._cache_hit = cached is not None
+                if cached is not None:
+                    stage.add(hits=1)
+                else:
+                    stage.add(misses=1)
+            if cached is not None:
+                self.opf_path, self.opf, self.toc = cached
+                self.uid = _find_uid(self.opf)
+                if not isinstance(self.opf.manifest, self.manifest_class):
+                    manifest = self.manifest_class()
+                    for item in self.opf.manifest.values():
+                        manifest.append(item)
+                    self.opf.manifest = manifest
+                return
 
-        for element in container_xml.getElementsByTagName('rootfile'):
-            if element.getAttribute('media-type') == MIMETYPE_OPF:
-                # Only take the first full-path available
-                self.opf_path = element.getAttribute('full-path')
-                break
+        # Read container.xml to get OPF xml file path
+        with self._stage('container') as stage:
+            stage.add_member(self.getinfo('META-INF/container.xml'))
+            self.opf_path = _read_opf_path(self)
 
         # Read OPF xml file
-        xml_string = self.read(self.opf_path)
-        self.opf = opf.parse_opf(xml_string)
-        uids = [x for x in self.opf.metadata.identifiers
-                      if x[1] == self.opf.uid_id]
-        if uids:
-            self.uid = uids[0]
-        else:
-            self.uid = None
-            warnings.warn('The ePub does not define any uid', SyntaxWarning)
+        with self._stage('opf') as stage:
+            stage.add_member(self.getinfo(self.opf_path))
+            xml_string = self.read(self.opf_path)
+            self.opf = opf.parse_opf(xml_string,
+                                     manifest_class=self.manifest_class)
+            stage.add(elements=len(self.opf.manifest) +
+                      len(self.opf.spine.itemrefs))
+        self.uid = _find_uid(self.opf)
 
         item_toc = self.get_item(self.opf.spine.toc)
 
         # Inspect NCX toc file
         self.toc = None
         if item_toc is not None:
-            self.toc = ncx.parse_toc(self.read_item(item_toc))
+            if self.lazy_toc:
+                self._toc_item = item_toc
+            else:
+                self.toc = self._parse_toc(item_toc)
         else:
             warnings.warn('The ePub does not define any NCX file',
                           SyntaxWarning)
             self.toc = ncx.Ncx()
             self.toc.uid = self.uid
 
+        if cache_key is not None:
+            self.cache.set(cache_key, (self.opf_path, self.opf, self.toc))
+
+    def _parse_toc(self, item):
+        """Read and parse the NCX file `item`, as the `ncx` stage."""
+        with self._stage('ncx') as stage:
+            path = self._item_path(item)
+            stage.add_member(self.getinfo(path))
+            toc = ncx.parse_toc(self.read(path))
+            if self.stats is not None:
+                stage.add(elements=_count_toc_nodes(toc))
+        return toc
+
+    def _stage(self, name):
+        """Return a context manager measuring the stage `name`.
+
+        Without stats, it is a shared object that does nothing.
+
+        """
+        if self.stats is None:
+            return stats.NULL_STAGE
+        return self.stats.stage(name)
+
     def close(self):
         if self.fp is None:
             return
         if self.mode in ('w', 'a'):
             self._write_close()
         zipfile.ZipFile.close(self)
+        if self._reader is not None:
+            if self._reader is not self._buffer_file:
+                self._reader.close()
+            self._reader = None
+        if self._buffer_file is not None:
+            self._release_buffer()
+
+    def _release_buffer(self):
+        """Release the memory map, unless views of it are still used.
+
+        A memoryview given by `read_item_view` keeps the map alive: it is
+        unmapped once the last of them is released.
+
+        """
+        buffer = self._buffer_file.buffer
+        # memoryview.release is new in Python 3.2
+        if hasattr(buffer, 'release'):
+            buffer.release()
+        self._buffer_file = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass
+            self._mmap = None
+
+    def _archive_end(self):
+        """Return the offset where the members of the archive end.
+
+        Python 2 zipfile.ZipFile does not move `start_dir` forward when it
+        writes a member: its file is left at the end of the last member, where
+        the next one is written.
+
+        """
+        if sys.version_info < (3,):
+            return self.fp.tell()
+        return self.start_dir
 
     def remove_paths(self, paths):
         """Remove files from the archive
 
-        Warning: This will be slow, it needs to recreate from scratch the
-        complete archive.
+        Files are removed in place: members stored after the first removed one
+        are moved down as raw bytes (without decompression or recompression),
+        and the central directory is written again when the epub is closed.
+        Members stored before it are not touched, so removing the last
+        members of the archive only truncates the file.
 
-        This method (well, the whole behavior of "write epub file") needs
-        a rework in a future version.
+        This function will raise a RuntimeError if epub is already closed. It
+        will raise an IOError if epub is open in read-only (`r` mode).
+
+        """
+        self.check_mode_write()
+        paths = set(paths)
+        removed = [info for info in self.filelist if info.filename in paths]
+        if not removed:
+            return
+        if not getattr(self, '_seekable', True):
+            raise IOError('Can not remove files from an unseekable archive.')
+
+        # A member spans from its local header up to the next member (or up
+        # to the central directory for the last one).
+        members = sorted(self.filelist, key=lambda info: info.header_offset)
+        ends = [info.header_offset for info in members[1:]]
+        ends.append(self._archive_end())
+
+        position = min(info.header_offset for info in removed)
+        for info, end in zip(members, ends):
+            if info.header_offset < position or info.filename in paths:
+                continue
+            size = end - info.header_offset
+            _copy_bytes(self.fp, info.header_offset, self.fp, position, size)
+            info.header_offset = position
+            position += size
+
+        self.filelist = [info for info in self.filelist
+                         if info.filename not in paths]
+        for info in removed:
+            self.NameToInfo.pop(info.filename, None)
+
+        self.start_dir = position
+        self.fp.seek(position)
+        self.fp.truncate()
+        self._didModify = True
+
+    def copy_member(self, source, member, arcname=None):
+        """Copy a member of another zip archive into this epub, as it is.
+
+        The compressed data of the member is copied verbatim: it is neither
+        decompressed nor compressed again. `source` is a zipfile.ZipFile (or
+        an EpubFile) open for reading, and `member` a name or a ZipInfo of
+        this archive. The member is stored under `arcname` if given, under its
+        own name otherwise.
+
+        This function will raise a RuntimeError if epub is already closed. It
+        will raise an IOError if epub is open in read-only (`r` mode).
+
+        """
+        self.check_mode_write()
+        if not isinstance(member, zipfile.ZipInfo):
+            member = source.getinfo(member)
+        return _copy_raw_member(source, self, member, arcname)
+
+    def repack(self, filename):
+        """Write a compact copy of the archive to `filename`.
+
+        Every member is copied without recompression (see `copy_member`), the
+        `mimetype` file first, then the others in archive order, leaving out
+        any unused space between members. Only members already stored are
+        copied: in `w` or `a` mode, OPF and NCX files are written on close.
 
         """
-        with tempfile.NamedTemporaryFile('rb', delete=False) as temp:
-            with zipfile.ZipFile(temp.name, 'w') as new_zip:
-                for item in self.infolist():
-                    if item.filename not in paths:
-                        new_zip.writestr(item, self.read(item.filename))
-            zipfile.ZipFile.close(self)
-            shutil.move(temp.name, self.filename)
-            zipfile.ZipFile.__init__(self, self.filename, self.mode)
+        members = sorted(self.infolist(),
+                         key=lambda info: (info.filename != 'mimetype',
+                                           info.header_offset))
+        with zipfile.ZipFile(filename, 'w') as target:
+            for info in members:
+                _copy_raw_member(self, target, info)
 
     def _write_close(self):
         """Handle writes when closing epub.
@@ -173,7 +748,22 @@ class EpubFile(zipfile.ZipFile):
         generated: container, OPF, and NCX.
 
         """
+        with self._stage('write_close') as stage:
+            written = self._write_generated_files()
+            if self.stats is not None:
+                elements = (len(self.opf.manifest) +
+                            len(self.opf.spine.itemrefs))
+                if len(written) > 2:
+                    elements += _count_toc_nodes(self.toc)
+                stage.add(bytes_written=sum(self.getinfo(path).compress_size
+                                            for path in written),
+                          elements=elements)
+
+    def _write_generated_files(self):
+        """Write container, OPF and NCX files, and return their paths."""
         item_toc = self.get_item(self.opf.spine.toc)
+        # Load a lazy toc before its file is removed from the archive
+        toc = self.toc
 
         # Remove the old files
         to_remove = ['META-INF/container.xml', self.opf_path]
@@ -190,16 +780,33 @@ class EpubFile(zipfile.ZipFile):
         self.writestr('META-INF/container.xml',
                       self._build_container().encode('utf-8'))
         # Write OPF File
-        self.writestr(self.opf_path,
-                      self.opf.as_xml_document().toxml().encode('utf-8'))
+        self._write_member(self.opf_path, self.opf.write_to)
+        written = ['META-INF/container.xml', self.opf_path]
         # Write NCX File if exist
         if item_toc:
             toc_path = os.path.join(
                 self.content_path, item_toc.href
             ).replace('\\', '/')
-            toc_content = self.toc.as_xml_document().toxml().encode('utf-8')
+            self._write_member(toc_path, toc.write_to)
+            written.append(toc_path)
+        return written
 
-            self.writestr(toc_path, toc_content)
+    def _write_member(self, path, write_to, force_zip64=False):
+        """Write the member `path` with `write_to(fp)`.
+
+        `write_to` writes the content to a binary file-like object: the member
+        stream itself when zipfile supports it (Python 3.6+), else a buffer
+        then written with `writestr`. Use `force_zip64` when the content may
+        be larger than 2 GiB: zipfile can not tell it in advance.
+
+        """
+        if ZIPFILE_OPEN_WRITE:
+            with self.open(path, 'w', force_zip64=force_zip64) as fp:
+                write_to(fp)
+        else:
+            fp = io.BytesIO()
+            write_to(fp)
+            self.writestr(path, fp.getvalue())
 
     def _build_container(self):
         """Build a simple XML container as in epub 2.0.1 specification."""
@@ -239,6 +846,38 @@ class EpubFile(zipfile.ZipFile):
         if append_to_spine:
             self.opf.spine.add_itemref(manifest_item.identifier, is_linear)
 
+    def add_item_stream(self, source, manifest_item,
+                        append_to_spine=False, is_linear=True):
+        """Add a file to epub from its content instead of a filename.
+
+        `source` can be bytes, a binary file-like object or an iterable of
+        bytes chunks (eg. a generator). Its content is written to the archive
+        chunk by chunk, without any temporary file (Python 3.6+; previous
+        versions of zipfile need the whole content in memory).
+
+        Everything else works as for `add_item`, except that the item is added
+        to the manifest (and spine) only once its content is written.
+
+        """
+        self.check_mode_write()
+
+        write_path = os.path.join(
+            self.content_path, manifest_item.href
+        ).replace('\\', '/')
+
+        def write_to(fp):
+            for chunk in _iter_chunks(source):
+                fp.write(chunk)
+
+        # Only the size of bytes is known before writing
+        force_zip64 = not isinstance(source, (bytes, bytearray)) or \
+            len(source) * 1.05 > zipfile.ZIP64_LIMIT
+        self._write_member(write_path, write_to, force_zip64)
+
+        self.opf.manifest.append(manifest_item)
+        if append_to_spine:
+            self.opf.spine.add_itemref(manifest_item.identifier, is_linear)
+
     def check_mode_write(self):
         """Raise error if epub file is not writable.
 
@@ -260,10 +899,7 @@ class EpubFile(zipfile.ZipFile):
     def extract_item(self, item, to_path=None):
         """Extract an item from its href in epub to `to_path` location.
         """
-        path = item if not hasattr(item, 'href') else item.href
-        member_path = os.path.join(self.content_path, path).replace('\\', '/')
-
-        return  self.extract(member=member_path, path=to_path)
+        return  self.extract(member=self._item_path(item), path=to_path)
 
     def get_item(self, identifier):
         """Get an item from manifest through its "id" attribute.
@@ -279,14 +915,7 @@ class EpubFile(zipfile.ZipFile):
         Return an EpubManifestItem if found, else None.
 
         """
-        found = [x for x in self.opf.manifest.values() if x.href == href]
-        size = len(found)
-        if size == 1:
-            return found[0]
-        elif size > 1:
-            raise LookupError('Multiple items are found with this href.')
-        else:
-            return None
+        return self.opf.manifest.get_by_href(href)
 
     # read method is zipfile.ZipFile.read(path)
 
@@ -300,14 +929,216 @@ class EpubFile(zipfile.ZipFile):
         as indicated in the opf file.
 
         """
+        path = self._item_path(item)
+        with self._stage('read_item') as stage:
+            info = self.getinfo(path)
+            stage.add_member(info)
+            with self.tracer.span('read member', {
+                    'epub.member': path,
+                    'epub.compressed_size': info.compress_size,
+                    'epub.size': info.file_size}):
+                return self._read_member(info)
+
+    def _read_member(self, info):
+        """Read the content of member `info`.
+
+        A deflated member is read as is, then decompressed out of the archive
+        lock, as the "decompress" span. With concurrent reads, a stored
+        member is read without the lock as well. Other members are left to
+        zipfile.ZipFile.read.
+
+        """
+        if info.flag_bits & 0x01 or not self.fp:
+            return self.read(info)
+        if info.compress_type == zipfile.ZIP_DEFLATED:
+            raw = self._read_payload(info)
+            with self.tracer.span('decompress', {
+                    'epub.member': info.filename,
+                    'epub.compressed_size': info.compress_size,
+                    'epub.size': info.file_size}):
+                data = zlib.decompress(raw, -zlib.MAX_WBITS)
+        elif info.compress_type == zipfile.ZIP_STORED and \
+                self._reader is not None:
+            data = self._read_payload(info)
+        else:
+            return self.read(info)
+        if len(data) != info.file_size or \
+           zlib.crc32(data) & 0xffffffff != info.CRC:
+            raise BadEpubFile('Bad CRC-32 for file %s.' % info.filename)
+        return data
+
+    def _read_payload(self, info, start=0, size=None):
+        """Read the raw payload of member `info`, from `start`.
+
+        With concurrent reads, it is read without the archive lock, and the
+        offset of the payload is kept for the next reads. Otherwise, like
+        zipfile, it raises a ValueError while a member is being written.
+
+        """
+        if size is None:
+            size = info.compress_size - start
+        if self._reader is None:
+            with self._lock:
+                if getattr(self, '_writing', False):
+                    raise ValueError('Can\'t read from the ZIP file while '
+                                     'there is an open writing handle.')
+                position = self.fp.tell()
+                try:
+                    self.fp.seek(_member_data_offset(self.fp, info) + start)
+                    return self.fp.read(size)
+                finally:
+                    # Python 2 zipfile writes the next member where its file
+                    # is (see `_archive_end`).
+                    self.fp.seek(position)
+        offset = self._data_offsets.get(info.filename)
+        if offset is None:
+            header = self._reader.read_at(info.header_offset,
+                                          zipfile.sizeFileHeader)
+            offset = self._data_offsets[info.filename] = \
+                _data_offset(info, header)
+        return self._reader.read_at(offset + start, size)
+
+    def open_item(self, item):
+        """Open a file from the epub zipfile container for reading.
+
+        "item" parameter is the same as for `read_item`. Return a binary
+        file-like object (see zipfile.ZipFile.open) reading the file content
+        chunk by chunk, instead of the whole content at once. It is seekable
+        when the epub file itself is (Python 3.7+).
+
+        """
+        return self.open(self._item_path(item))
+
+    def get_item_range(self, item):
+        """Return the (offset, length) of a stored file in the epub archive.
+
+        "item" parameter is the same as for `read_item`. The file content is
+        the `length` bytes found at `offset` of the archive file, so that it
+        can be served (eg. for HTTP Range requests) without zipfile.
+
+        Raise a ValueError if the file is compressed or encrypted, and a
+        KeyError if there is no such file.
+
+        """
+        info = self.getinfo(self._item_path(item))
+        if not _is_stored(info):
+            raise ValueError('Item %s is not stored uncompressed.'
+                             % info.filename)
+        with self._lock:
+            position = self.fp.tell()
+            try:
+                offset = _member_data_offset(self.fp, info)
+            finally:
+                self.fp.seek(position)
+        return offset, info.file_size
+
+    def read_item_range(self, item, start=0, size=None):
+        """Read `size` bytes of a file from the epub archive, from `start`.
+
+        "item" parameter is the same as for `read_item`. Without `size`, the
+        file is read up to its end. Fewer bytes are returned when the file
+        ends before `start + size`.
+
+        A stored file is read directly from the archive file, without CRC
+        check; a compressed one is decompressed up to `start` first.
+
+        """
+        if start < 0 or (size is not None and size < 0):
+            raise ValueError('Negative start or size: %r, %r.'
+                             % (start, size))
+        path = self._item_path(item)
+        info = self.getinfo(path)
+        end = info.file_size if size is None else \
+              min(start + size, info.file_size)
+        if start >= end:
+            return b''
+
+        if _is_stored(info):
+            return self._read_payload(info, start, end - start)
+
+        with self.open(path) as member:
+            position = 0
+            while position < start:
+                skipped = len(member.read(min(start - position,
+                                              COPY_BUFFER_SIZE)))
+                if not skipped:
+                    return b''
+                position += skipped
+            return member.read(end - start)
+
+    def read_item_view(self, item):
+        """Read a file from the epub zipfile container as a memoryview.
+
+        "item" parameter is the same as for `read_item`. When the epub file is
+        memory-mapped (see `use_mmap`), a stored file is a view of the mapped
+        memory, without any copy nor CRC check, and a deflated one is inflated
+        straight from it. Otherwise, it is a view of `read_item(item)`.
+
+        """
+        path = self._item_path(item)
+        if self._buffer_file is None:
+            return memoryview(self.read(path))
+
+        info = self.getinfo(path)
+        if info.flag_bits & 0x01 or info.compress_type not in (
+                zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            return memoryview(self.read(path))
+
+        with self._lock:
+            offset = _member_data_offset(self._buffer_file, info)
+        payload = self._buffer_file.view(offset, info.compress_size)
+        if info.compress_type == zipfile.ZIP_STORED:
+            return payload
+
+        if bytes is str:
+            # Python 2 zlib does not read memoryviews
+            payload = payload.tobytes()
+        data = zlib.decompressobj(-zlib.MAX_WBITS).decompress(payload)
+        if len(data) != info.file_size or \
+           zlib.crc32(data) & 0xffffffff != info.CRC:
+            raise BadEpubFile('Bad CRC-32 for file %s.' % info.filename)
+        return memoryview(data)
+
+    def _item_path(self, item):
+        """Return the archive path of an item (or of an href)."""
         path = item
         if hasattr(item, 'href'):
             path = item.href
+        # Replace \ by /, as ZipFile always uses / as path separator.
+        return os.path.join(self.content_path, path).replace('\\', '/')
+
 
-        return self.read(
-            # Replace \ by /, as ZipFile always uses / as path separator.
-            os.path.join(self.content_path, path).replace('\\', '/')
-        )
+class EpubMetadata(object):
+    """Lightweight, read-only access to the metadata of an epub file.
+
+    Only META-INF/container.xml and the <metadata> element of the OPF file are
+    read: manifest, spine, guide and NCX are left out, and the archive is
+    closed once done. Its `opf` attribute is an Opf object with an empty
+    manifest, spine and guide, so it can be given to a Book object for its
+    metadata properties.
+
+    """
+
+    @property
+    def content_path(self):
+        """Return the content path, ie, the path relative to OPF file."""
+        return os.path.dirname(self.opf_path).replace('\\', '/')
+
+    def __init__(self, filename):
+        if _is_buffer(filename):
+            self.filename = None
+            archive = zipfile.ZipFile(_BufferFile(filename), 'r')
+        else:
+            self.filename = filename
+            archive = zipfile.ZipFile(filename, 'r')
+        with archive:
+            self.opf_path = _read_opf_path(archive)
+            opf_file = archive.open(self.opf_path)
+            try:
+                self.opf = opf.parse_opf_metadata(opf_file)
+            finally:
+                opf_file.close()
+        self.uid = _find_uid(self.opf)
 
 
 class Book(object):
@@ -320,6 +1151,11 @@ class Book(object):
     def __init__(self, epub_file):
         self.epub_file = epub_file
 
+    @property
+    def _tracer(self):
+        # An EpubMetadata has no tracer of its own
+        return getattr(self.epub_file, 'tracer', None) or tracing.get_tracer()
+
     @property
     def creators(self):
         return self.epub_file.opf.metadata.creators
@@ -393,18 +1229,26 @@ class Book(object):
         """
         Return a list of linear chapter from spine.
         """
-        return [BookChapter(self, identifier)
-                for identifier, linear in self.epub_file.opf.spine.itemrefs
-                if linear]
+        with self._tracer.span('resolve chapter') as span:
+            chapters = [BookChapter(self, identifier)
+                        for identifier, linear
+                        in self.epub_file.opf.spine.itemrefs
+                        if linear]
+            span.set_attribute('epub.chapters', len(chapters))
+        return chapters
 
     @property
     def extra_chapters(self):
         """
         Return a list of non-linear chapter from spine.
         """
-        return [BookChapter(self, identifier)
-                for identifier, linear in self.epub_file.opf.spine.itemrefs
-                if not linear]
+        with self._tracer.span('resolve chapter') as span:
+            chapters = [BookChapter(self, identifier)
+                        for identifier, linear
+                        in self.epub_file.opf.spine.itemrefs
+                        if not linear]
+            span.set_attribute('epub.chapters', len(chapters))
+        return chapters
 
 
 class BookChapter(object):
@@ -419,4 +1263,6 @@ class BookChapter(object):
         self._fragment = fragment
 
     def read(self):
-        return self._book.epub_file.read_item(self._manifest_item)
+        with self._book._tracer.span('read chapter', {
+                'epub.chapter': self._manifest_item.identifier}):
+            return self._book.epub_file.read_item(self._manifest_item)
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+"""
+Asyncio API for epub files, for non-blocking servers (Python 3.5+).
+
+Opening an epub, reading or decompressing its items and writing it on close
+are blocking operations. This module runs them in an executor (the default
+executor of the event loop, or a given one), so that they do not stall the
+event loop:
+
+    book = await epub.aio.open_epub('path/to/my.epub')
+    async with book:
+        content = await book.read_item('Text/cover.xhtml')
+        async for chunk in book.iter_item('Images/cover.jpg'):
+            await response.write(chunk)
+
+Reads can run concurrently on the same epub file: compressed items are
+decompressed out of the archive lock (see `epub.EpubFile.read_item`). Writes
+(`add_item`, `add_item_stream` and `close`) run one at a time. In `w` or `a`
+mode, reads wait for the pending writes too: zipfile can not read an archive
+while one of its members is being written.
+"""
+
+
+import asyncio
+import functools
+import threading
+
+import epub
+
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+async def _run(executor, function, *args, **kwargs):
+    """Run `function(*args, **kwargs)` in `executor` and return its result."""
+    # In a coroutine, this is the running loop
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(
+        executor, functools.partial(function, *args, **kwargs))
+
+
+async def open_epub(filename, mode=None, executor=None, **options):
+    """Open an epub file in `executor` and return an AsyncEpubFile.
+
+    `options` are the other parameters of `epub.open_epub` (`lazy_toc`,
+    `cache`, etc.). With no `executor`, the default executor of the event
+    loop is used.
+
+    """
+    epub_file = await _run(executor, epub.open_epub, filename, mode,
+                           **options)
+    return AsyncEpubFile(epub_file, executor)
+
+
+async def open_epub_metadata(filename, executor=None):
+    """Read the metadata of an epub file in `executor` (see
+    `epub.open_epub_metadata`)."""
+    return await _run(executor, epub.open_epub_metadata, filename)
+
+
+class AsyncEpubFile(object):
+    """Asynchronous proxy of an EpubFile.
+
+    Blocking methods are coroutines run in `executor`. Parsed data (`opf`,
+    `toc`, `uid`) and manifest lookups are available as for an EpubFile.
+
+    """
+
+    @property
+    def opf(self):
+        return self.epub_file.opf
+
+    @property
+    def opf_path(self):
+        return self.epub_file.opf_path
+
+    @property
+    def toc(self):
+        """Return the Ncx object of the epub.
+
+        With `lazy_toc`, the NCX file is read the first time: use `load_toc`
+        to read it out of the event loop.
+
+        """
+        return self.epub_file.toc
+
+    @property
+    def uid(self):
+        return self.epub_file.uid
+
+    def __init__(self, epub_file, executor=None):
+        self.epub_file = epub_file
+        self.executor = executor
+        self._write_lock = threading.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def _run(self, function, *args, **kwargs):
+        return _run(self.executor, function, *args, **kwargs)
+
+    def _locked(self, function, *args, **kwargs):
+        """Call `function` while no other write runs (in the executor)."""
+        with self._write_lock:
+            return function(*args, **kwargs)
+
+    def _reading(self, function, *args, **kwargs):
+        """Call `function` while no write runs, unless the epub file is
+        read-only (in the executor)."""
+        if self.epub_file.mode == 'r':
+            return function(*args, **kwargs)
+        return self._locked(function, *args, **kwargs)
+
+    def get_item(self, identifier):
+        return self.epub_file.get_item(identifier)
+
+    def get_item_by_href(self, href):
+        return self.epub_file.get_item_by_href(href)
+
+    async def load_toc(self):
+        """Return the Ncx object of the epub, read in the executor."""
+        return await self._run(self._reading, getattr, self.epub_file, 'toc')
+
+    async def read_item(self, item):
+        """Read an item (see `epub.EpubFile.read_item`) in the executor."""
+        return await self._run(self._reading, self.epub_file.read_item, item)
+
+    async def read_item_range(self, item, start=0, size=None):
+        """Read a part of an item (see `epub.EpubFile.read_item_range`)."""
+        return await self._run(self._reading, self.epub_file.read_item_range,
+                               item, start, size)
+
+    def iter_item(self, item, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Return an asynchronous iterator over the content of an item.
+
+        Each chunk of at most `chunk_size` bytes is read (and decompressed)
+        in the executor.
+
+        """
+        return ItemIterator(self, item, chunk_size)
+
+    async def add_item(self, filename, manifest_item,
+                       append_to_spine=False, is_linear=True):
+        """Add a file to the epub (see `epub.EpubFile.add_item`)."""
+        await self._run(self._locked, self.epub_file.add_item, filename,
+                        manifest_item, append_to_spine, is_linear)
+
+    async def add_item_stream(self, source, manifest_item,
+                              append_to_spine=False, is_linear=True):
+        """Add a file to the epub from its content (see
+        `epub.EpubFile.add_item_stream`)."""
+        await self._run(self._locked, self.epub_file.add_item_stream, source,
+                        manifest_item, append_to_spine, is_linear)
+
+    async def close(self):
+        """Close the epub file, and write it if opened in `w` or `a` mode."""
+        await self._run(self._locked, self.epub_file.close)
+
+
+class ItemIterator(object):
+    """Asynchronous iterator over the content of an epub item, by chunks.
+
+    The item is opened on the first iteration and closed once read. Use
+    `aclose` to close it before its end.
+
+    """
+
+    def __init__(self, book, item, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.book = book
+        self.item = item
+        self.chunk_size = chunk_size
+        self._file = None
+        self._done = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._done:
+            raise StopAsyncIteration
+        book = self.book
+        if self._file is None:
+            self._file = await book._run(book._reading,
+                                         book.epub_file.open_item, self.item)
+        chunk = await book._run(book._reading, self._file.read,
+                                self.chunk_size)
+        if not chunk:
+            await self.aclose()
+            raise StopAsyncIteration
+        return chunk
+
+    async def aclose(self):
+        """Close the item file."""
+        self._done = True
+        if self._file is not None:
+            item_file, self._file = self._file, None
+            await self.book._run(self.book._reading, item_file.close)
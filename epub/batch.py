@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+"""
+Open and parse many epub files at once, over a pool of processes.
+
+XML parsing of OPF and NCX files is bound to one core by the GIL; spreading
+files over processes allows to use every core when scanning a whole library:
+
+    for result in open_many(paths, workers=8):
+        if result.error is None:
+            print result.path, result.opf.metadata.titles
+"""
+
+
+import multiprocessing
+
+import epub
+
+
+class BatchResult(object):
+    """Parsed content of one epub file opened by `open_many`.
+
+    Only picklable, already parsed objects are kept: the archive itself is
+    closed in the worker process. If the file can not be opened or parsed,
+    `error` holds the exception raised, and other attributes are None.
+
+    """
+
+    def __init__(self, path, opf_path=None, uid=None, opf=None, toc=None,
+                 error=None):
+        self.path = path
+        self.opf_path = opf_path
+        self.uid = uid
+        self.opf = opf
+        self.toc = toc
+        self.error = error
+
+
+def open_many(paths, workers=None, metadata_only=False, chunksize=1):
+    """Open each epub file of `paths` and yield a BatchResult for each one.
+
+    Files are opened and parsed by a pool of `workers` processes (by default,
+    one per CPU), and results are yielded in completion order, not in the
+    order of `paths`. An error on one file does not stop the batch: it is
+    reported by the `error` attribute of its result.
+
+    With `metadata_only`, only the OPF metadata are read (see
+    `epub.open_epub_metadata`) and `toc` is None.
+
+    With `workers=1`, files are opened one after another in the current
+    process, without any pool.
+
+    """
+    if metadata_only:
+        worker = _open_metadata
+    else:
+        worker = _open_epub
+
+    if workers == 1:
+        for path in paths:
+            yield worker(path)
+        return
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        for result in pool.imap_unordered(worker, paths, chunksize):
+            yield result
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def _open_epub(path):
+    """Open and fully parse one epub file, in a worker process."""
+    try:
+        with epub.open_epub(path) as epub_file:
+            return BatchResult(path,
+                               opf_path=epub_file.opf_path,
+                               uid=epub_file.uid,
+                               opf=epub_file.opf,
+                               toc=epub_file.toc)
+    except Exception as error:
+        return BatchResult(path, error=error)
+
+
+def _open_metadata(path):
+    """Read only the OPF metadata of one epub file, in a worker process."""
+    try:
+        metadata = epub.open_epub_metadata(path)
+        return BatchResult(path,
+                           opf_path=metadata.opf_path,
+                           uid=metadata.uid,
+                           opf=metadata.opf)
+    except Exception as error:
+        return BatchResult(path, error=error)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+"""
+Persistent on-disk cache of parsed OPF and NCX files.
+
+Opening the same epub again and again parses the same xml files each time. A
+`ParseCache` stores the parsed objects of an epub file in a directory, keyed
+by a fingerprint of its archive, so that a warm open does not parse any xml:
+
+    cache = ParseCache('/var/cache/epub')
+    with epub.open_epub('path/to/my.epub', cache=cache) as book:
+        print book.opf.metadata.titles
+
+Entries are pickled: the cache directory must not be writable by untrusted
+users.
+"""
+
+
+import hashlib
+import os
+import pickle
+import tempfile
+import zlib
+
+
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+ENTRY_SUFFIX = '.epubcache'
+
+# os.replace overwrites an existing entry on every OS (Python 3.3+)
+_replace = getattr(os, 'replace', os.rename)
+
+
+class ParseCache(object):
+    """Size-bounded, least recently used cache of parsed epub files.
+
+    Each entry is a compressed pickle file in `directory`. When the total
+    size of entries grows over `max_size` bytes, the least recently used
+    ones are removed.
+
+    """
+
+    def __init__(self, directory, max_size=None):
+        self.directory = directory
+        self.max_size = max_size or DEFAULT_MAX_SIZE
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def fingerprint(self, zip_file):
+        """Return the cache key of an opened zipfile.ZipFile.
+
+        The key is built from the size and modification time of the file (if
+        it is a file on disk), and from the name, CRC and size of each entry
+        of the zip central directory.
+
+        """
+        key = hashlib.sha1()
+        filename = getattr(zip_file, 'filename', None)
+        if filename and os.path.isfile(filename):
+            stat = os.stat(filename)
+            key.update(('%d:%r\n' % (stat.st_size, stat.st_mtime))
+                       .encode('utf-8'))
+        for info in zip_file.infolist():
+            key.update(('%s:%d:%d\n' % (info.filename, info.CRC,
+                                        info.file_size)).encode('utf-8'))
+        return key.hexdigest()
+
+    def get(self, key):
+        """Return the value stored for `key`, or None if there is none."""
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except (IOError, OSError):
+            return None
+
+        try:
+            value = pickle.loads(zlib.decompress(data))
+        except Exception:
+            # Broken entry: drop it, the caller will parse the file again
+            self._remove(path)
+            return None
+
+        # Mark the entry as recently used
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key, value):
+        """Store `value` for `key`, then evict entries over `max_size`."""
+        data = zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        handle, temp_path = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                f.write(data)
+            _replace(temp_path, self._entry_path(key))
+        except:
+            self._remove(temp_path)
+            raise
+        self._evict()
+
+    def clear(self):
+        """Remove every entry of the cache."""
+        for path, stat in self._entries():
+            self._remove(path)
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def _entries(self):
+        """Return a list of (path, os.stat result) of every entry."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(ENTRY_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                entries.append((path, os.stat(path)))
+            except OSError:
+                pass
+        return entries
+
+    def _evict(self):
+        """Remove least recently used entries until under `max_size`."""
+        entries = self._entries()
+        total = sum(stat.st_size for path, stat in entries)
+        if total <= self.max_size:
+            return
+        entries.sort(key=lambda entry: entry[1].st_mtime)
+        for path, stat in entries:
+            if total <= self.max_size:
+                break
+            self._remove(path)
+            total -= stat.st_size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -13,11 +13,176 @@ NCX Epub spec: http://idpf.org/epub/20/spec/OPF_2.0.1_draft.htm#Section2.4.1
 """
 
 
+import io
+
+from array import array
 from xml.dom import minidom
 
+try:
+    from xml.etree import cElementTree as ElementTree
+except ImportError:
+    from xml.etree import ElementTree
+
+
+from epub.utils import XMLNS_XML, XmlWriter, split_tag
+
+
+PARSER_MINIDOM = 'minidom'
+PARSER_ITERPARSE = 'iterparse'
+DEFAULT_PARSER = PARSER_ITERPARSE
+
+
+def parse_toc(xmlstring, parser=None):
+    """Inspect an NCX formated xml document.
+
+    The `parser` argument select the backend used to read the xml:
+    `PARSER_ITERPARSE` (the default) builds the Ncx in a single pass,
+    `PARSER_MINIDOM` builds a full DOM first, like older versions did.
+
+    """
+    parser = parser or DEFAULT_PARSER
+    if parser == PARSER_ITERPARSE:
+        return _parse_toc_iterparse(xmlstring)
+    elif parser == PARSER_MINIDOM:
+        return _parse_toc_minidom(xmlstring)
+    else:
+        raise ValueError('Unknown NCX parser: %s' % parser)
+
+
+_XML_LANG = '{%s}lang' % XMLNS_XML
+
+
+def _parse_toc_iterparse(xmlstring):
+    """Inspect an NCX formated xml document in one pass with iterparse.
+
+    Only the chain of currently open elements is kept: a stack of frames
+    `[name, object, text, element]`, where `object` is the Ncx structure
+    built for this element (or None if it is ignored), and `text` the
+    content of its first <text> child. Every element is removed from its
+    parent once closed, so memory is bounded by the depth of the document,
+    not by the count of its elements.
+
+    """
+    if not isinstance(xmlstring, bytes):
+        xmlstring = xmlstring.encode('utf-8')
+
+    toc = Ncx()
+    metas = {'dtb:uid': '',
+             'dtb:depth': '',
+             'dtb:totalPageCount': '',
+             'dtb:maxPageNumber': '',
+             'dtb:generator': ''}
+    # Only the first <head>, <docTitle>, <navMap> and <pageList> are used
+    seen = set()
+    in_head = False
+
+    stack = []
+    # Python 2 iterparse only accepts native strings as event names
+    events = ElementTree.iterparse(io.BytesIO(xmlstring),
+                                   events=(str('start'), str('end')))
+    for event, element in events:
+        namespace, name = split_tag(element.tag)
+
+        if event == 'start':
+            parent = stack[-1][1] if stack else None
+            obj = None
+            if not stack:
+                if namespace:
+                    toc.xmlns = namespace
+                if element.get('version'):
+                    toc.version = element.get('version')
+                if element.get(_XML_LANG):
+                    toc.lang = element.get(_XML_LANG)
+            elif name == 'head' and name not in seen:
+                seen.add(name)
+                in_head = True
+            elif name == 'navMap' and name not in seen:
+                seen.add(name)
+                obj = NavMap()
+                obj.identifier = element.get('id', '')
+                toc.nav_map = obj
+            elif name == 'navPoint' and isinstance(parent, (NavMap, NavPoint)):
+                obj = NavPoint()
+                obj.identifier = element.get('id', '')
+                obj.class_name = element.get('class', '')
+                obj.play_order = element.get('playOrder', '')
+                parent.add_point(obj)
+            elif name == 'pageList' and name not in seen:
+                seen.add(name)
+                obj = PageList()
+                obj.identifier = element.get('id', '')
+                obj.class_name = element.get('class', '')
+                toc.page_list = obj
+            elif name == 'pageTarget' and isinstance(parent, PageList):
+                obj = PageTarget()
+                obj.identifier = element.get('id', '')
+                obj.value = element.get('value', '')
+                obj.target_type = element.get('type', '')
+                obj.class_name = element.get('class', '')
+                obj.play_order = element.get('playOrder', '')
+                parent.add_target(obj)
+            elif name == 'navList':
+                obj = NavList()
+                obj.identifier = element.get('id', '')
+                obj.class_name = element.get('class', '')
+                toc.add_nav_list(obj)
+            elif name == 'navTarget' and isinstance(parent, NavList):
+                obj = NavTarget()
+                obj.identifier = element.get('id', '')
+                obj.value = element.get('value', '')
+                obj.class_name = element.get('class', '')
+                obj.play_order = element.get('playOrder', '')
+                parent.add_target(obj)
+            stack.append([name, obj, None, element])
+            continue
+
+        text = stack.pop()[2] or ''
+        if not stack:
+            break
+        frame = stack[-1]
+        parent = frame[1]
+
+        if name == 'text':
+            if frame[2] is None:
+                frame[2] = (element.text or '').strip()
+        elif name == 'navLabel':
+            if isinstance(parent, (NavMap, NavPoint, PageList, PageTarget,
+                                   NavList, NavTarget)):
+                parent.add_label(text,
+                                 element.get(_XML_LANG, ''),
+                                 element.get('dir', ''))
+        elif name == 'navInfo':
+            if isinstance(parent, (NavMap, PageList, NavList)):
+                parent.add_info(text,
+                                element.get(_XML_LANG, ''),
+                                element.get('dir', ''))
+        elif name == 'content':
+            if isinstance(parent, (NavPoint, PageTarget, NavTarget)):
+                parent.src = element.get('src', '')
+        elif name == 'meta':
+            if in_head:
+                metas[element.get('name', '')] = element.get('content', '')
+        elif name == 'head':
+            in_head = False
+        elif name == 'docTitle':
+            if name not in seen:
+                seen.add(name)
+                toc.title = text
+        elif name == 'docAuthor':
+            toc.authors.append(text)
+        frame[3].remove(element)
+
+    toc.uid = metas['dtb:uid']
+    toc.depth = metas['dtb:depth']
+    toc.total_page_count = metas['dtb:totalPageCount']
+    toc.max_page_number = metas['dtb:maxPageNumber']
+    toc.generator = metas['dtb:generator']
+
+    return toc
 
-def parse_toc(xmlstring):
-    """Inspect an NCX formated xml document."""
+
+def _parse_toc_minidom(xmlstring):
+    """Inspect an NCX formated xml document through a minidom Document."""
     toc = Ncx()
     toc_xml = minidom.parseString(xmlstring).documentElement
 
@@ -247,6 +412,22 @@ def _create_xml_element_text(data, name=None):
     return element
 
 
+def _write_xml_labels(writer, name, labels):
+    """Write navLabel (or navInfo, with name) elements of a labels list.
+
+    Each label is a (text, lang, direction) tuple, as given by `add_label`,
+    and is written with its <text> child element."""
+    for text, lang, direction in labels:
+        attributes = []
+        if lang:
+            attributes.append(('xml:lang', lang))
+        if direction:
+            attributes.append(('dir', direction))
+        writer.start(name, attributes)
+        writer.element('text', text=text or None)
+        writer.end(name)
+
+
 class Ncx(object):
     """Represent the structured content of a NCX file."""
 
@@ -309,6 +490,67 @@ class Ncx(object):
         doc.appendChild(ncx)
         return doc
 
+    def write_to(self, fp):
+        """Write the NCX xml document to the binary file-like object `fp`.
+
+        Elements are written as they go, without building any xml tree: the
+        output is the same as `as_xml_document().toxml()` encoded in utf-8
+        (attributes are sorted by the writer where minidom sorts them).
+
+        """
+        writer = XmlWriter(fp)
+        writer.declaration()
+        attributes = [('xmlns', self.xmlns), ('version', self.version)]
+        if self.lang:
+            attributes.append(('xml:lang', self.lang))
+        writer.start('ncx', attributes)
+
+        # head
+        metas = [('dtb:uid', self.uid),
+                 ('dtb:depth', self.depth),
+                 ('dtb:totalPageCount', self.total_page_count),
+                 ('dtb:maxPageNumber', self.max_page_number),
+                 ('dtb:generator', self.generator)]
+        metas = [(name, content) for name, content in metas if content]
+        if metas:
+            writer.start('head')
+            for name, content in metas:
+                writer.element('meta', [('name', name), ('content', content)])
+            writer.end('head')
+        else:
+            writer.start('head', empty=True)
+
+        # title
+        writer.start('docTitle')
+        writer.element('text', text=self.title or None)
+        writer.end('docTitle')
+
+        # authors
+        for text in self.authors:
+            writer.start('docAuthor')
+            writer.element('text', text=text or None)
+            writer.end('docAuthor')
+
+        # nav_map
+        self.nav_map.write_xml(writer)
+
+        # page_list
+        if self.page_list:
+            self.page_list.write_xml(writer)
+
+        # nav_lists
+        for nav_list in self.nav_lists:
+            nav_list.write_xml(writer)
+
+        writer.end('ncx')
+        writer.flush()
+
+    def as_xml_string(self):
+        """Return the NCX xml document as utf-8 encoded bytes."""
+        fp = io.BytesIO()
+        self.write_to(fp)
+        return fp.getvalue()
+
     def _head_as_xml_element(self):
         """Create an xml Element node <head> with meta-data of Ncx item."""
         doc = minidom.Document()
@@ -341,11 +583,27 @@ class Ncx(object):
 class NavMap(object):
     """Represente navMap tag of an NCX file."""
 
+    @property
+    def index(self):
+        """Return a NavIndex of the nav points, built on first use.
+
+        `add_point` drops the index; after any other change of the tree (eg.
+        a point added to a NavPoint), call `clear_index`.
+
+        """
+        if self._index is None:
+            self._index = NavIndex(self)
+        return self._index
+
     def __init__(self):
         self.identifier = None
         self.labels = []
         self.infos = []
         self.nav_point = []
+        self._index = None
+
+    def clear_index(self):
+        self._index = None
 
     def add_label(self, label, lang=None, direction=None):
         lang = lang or ''
@@ -359,6 +617,7 @@ class NavMap(object):
 
     def add_point(self, point):
         self.nav_point.append(point)
+        self._index = None
 
     def as_xml_element(self):
         """Return an xml dom Element node."""
@@ -391,8 +650,117 @@ class NavMap(object):
 
         return nav_map
 
+    def write_xml(self, writer):
+        """Write the <navMap> element with an epub.utils.XmlWriter.
+
+        Nav points are written recursively, one at a time."""
+        attributes = []
+        if self.identifier:
+            attributes.append(('id', self.identifier))
+        if not (self.labels or self.infos or self.nav_point):
+            writer.start('navMap', attributes, empty=True)
+            return
+        writer.start('navMap', attributes)
+        _write_xml_labels(writer, 'navLabel', self.labels)
+        _write_xml_labels(writer, 'navInfo', self.infos)
+        for nav_point in self.nav_point:
+            nav_point.write_xml(writer)
+        writer.end('navMap')
+
+
+class NavIndex(object):
+    """Flat index of the nav points of a NavMap, in document order.
+
+    Points are numbered in preorder (a point comes before its children), and
+    each position has its depth (0 for a point of the navMap itself), the
+    position of its parent (-1 for none), and the size of its subtree (the
+    point and all its descendants), so that:
+
+    - `points[i + 1:i + sizes[i]]` are the descendants of `points[i]`,
+    - `points[parents[i]]` is the parent of `points[i]`.
+
+    Points are also indexed by src, and by src without its fragment.
+
+    """
+
+    def __init__(self, nav_map):
+        self.points = []
+        self.depths = array(str('i'))
+        self.parents = array(str('i'))
+        self._positions = {}
+        self._by_src = {}
+        self._by_href = {}
+
+        # Preorder walk with an explicit stack, deepest TOC included
+        stack = [(point, 0, -1) for point in reversed(nav_map.nav_point)]
+        while stack:
+            point, depth, parent = stack.pop()
+            position = len(self.points)
+            self.points.append(point)
+            self.depths.append(depth)
+            self.parents.append(parent)
+            self._positions[point] = position
+            if point.src:
+                self._by_src.setdefault(point.src, []).append(position)
+                href = point.src.split('#', 1)[0]
+                self._by_href.setdefault(href, []).append(position)
+            stack.extend((child, depth + 1, position)
+                         for child in reversed(point.nav_point))
+
+        # A subtree size is known once its whole subtree is: walk backward
+        self.sizes = array(str('i'), [1]) * len(self.points)
+        for position in range(len(self.points) - 1, -1, -1):
+            parent = self.parents[position]
+            if parent >= 0:
+                self.sizes[parent] += self.sizes[position]
+
+    def __len__(self):
+        return len(self.points)
+
+    def __iter__(self):
+        return iter(self.points)
+
+    def position(self, point):
+        """Return the position of a point in the index (KeyError if none)."""
+        return self._positions[point]
+
+    def depth(self, point):
+        return self.depths[self._positions[point]]
+
+    def parent(self, point):
+        """Return the parent NavPoint of a point, or None for a top point."""
+        parent = self.parents[self._positions[point]]
+        if parent < 0:
+            return None
+        return self.points[parent]
+
+    def subtree(self, point):
+        """Return the list of descendants of a point, in document order."""
+        position = self._positions[point]
+        return self.points[position + 1:position + self.sizes[position]]
+
+    def find_by_src(self, src):
+        """Return the list of points whose src is `src`.
+
+        A `src` without fragment also matches the points pointing to a
+        fragment of this file (eg. 'Text/chap1.xhtml' matches
+        'Text/chap1.xhtml#part2').
+
+        """
+        if '#' in src:
+            positions = self._by_src.get(src, [])
+        else:
+            positions = self._by_href.get(src, [])
+        return [self.points[position] for position in positions]
+
 
 class NavPoint(object):
+    """Represent navPoint tag of an NCX file."""
+
+    # No instance dict: NavPoint, PageTarget and NavTarget objects are the
+    # bulk of a parsed NCX, and many of them may be kept in memory.
+    __slots__ = ('identifier', 'class_name', 'play_order', 'labels', 'src',
+                 'nav_point')
 
     def __init__(self):
         self.identifier = None
@@ -446,6 +814,22 @@ class NavPoint(object):
 
         return nav_point
 
+    def write_xml(self, writer):
+        """Write the <navPoint> element with an epub.utils.XmlWriter."""
+        attributes = []
+        if self.identifier:
+            attributes.append(('id', self.identifier))
+        if self.class_name:
+            attributes.append(('class', self.class_name))
+        if self.play_order:
+            attributes.append(('playOrder', self.play_order))
+        writer.start('navPoint', attributes)
+        _write_xml_labels(writer, 'navLabel', self.labels)
+        writer.element('content', [('src', self.src)])
+        for child in self.nav_point:
+            child.write_xml(writer)
+        writer.end('navPoint')
+
 
 class PageList(object):
 
@@ -507,8 +891,29 @@ class PageList(object):
 
         return page_list
 
+    def write_xml(self, writer):
+        """Write the <pageList> element with an epub.utils.XmlWriter."""
+        attributes = []
+        if self.identifier:
+            attributes.append(('id', self.identifier))
+        if self.class_name:
+            attributes.append(('class', self.class_name))
+        if not (self.labels or self.infos or self.page_target):
+            writer.start('pageList', attributes, empty=True)
+            return
+        writer.start('pageList', attributes)
+        _write_xml_labels(writer, 'navLabel', self.labels)
+        _write_xml_labels(writer, 'navInfo', self.infos)
+        for child in self.page_target:
+            child.write_xml(writer)
+        writer.end('pageList')
+
 
 class PageTarget(object):
+    """Represent pageTarget tag of an NCX file."""
+
+    __slots__ = ('identifier', 'value', 'target_type', 'class_name',
+                 'play_order', 'src', 'labels')
 
     def __init__(self):
         self.identifier = None
@@ -562,6 +967,24 @@ class PageTarget(object):
 
         return page_target
 
+    def write_xml(self, writer):
+        """Write the <pageTarget> element with an epub.utils.XmlWriter."""
+        attributes = []
+        if self.identifier:
+            attributes.append(('id', self.identifier))
+        if self.value:
+            attributes.append(('value', self.value))
+        if self.target_type:
+            attributes.append(('type', self.target_type))
+        if self.class_name:
+            attributes.append(('class', self.class_name))
+        if self.play_order:
+            attributes.append(('playOrder', self.play_order))
+        writer.start('pageTarget', attributes)
+        _write_xml_labels(writer, 'navLabel', self.labels)
+        writer.element('content', [('src', self.src)])
+        writer.end('pageTarget')
+
 
 class NavList(object):
 
@@ -623,8 +1046,29 @@ class NavList(object):
 
         return nav_list
 
+    def write_xml(self, writer):
+        """Write the <navList> element with an epub.utils.XmlWriter."""
+        attributes = []
+        if self.identifier:
+            attributes.append(('id', self.identifier))
+        if self.class_name:
+            attributes.append(('class', self.class_name))
+        if not (self.labels or self.infos or self.nav_target):
+            writer.start('navList', attributes, empty=True)
+            return
+        writer.start('navList', attributes)
+        _write_xml_labels(writer, 'navLabel', self.labels)
+        _write_xml_labels(writer, 'navInfo', self.infos)
+        for nav_target in self.nav_target:
+            nav_target.write_xml(writer)
+        writer.end('navList')
+
 
 class NavTarget(object):
+    """Represent navTarget tag of an NCX file."""
+
+    __slots__ = ('identifier', 'class_name', 'value', 'play_order', 'labels',
+                 'src')
 
     def __init__(self):
         self.identifier = None
@@ -673,3 +1117,19 @@ class NavTarget(object):
         nav_target.appendChild(content)
 
         return nav_target
+
+    def write_xml(self, writer):
+        """Write the <navTarget> element with an epub.utils.XmlWriter."""
+        attributes = []
+        if self.identifier:
+            attributes.append(('id', self.identifier))
+        if self.class_name:
+            attributes.append(('class', self.class_name))
+        if self.value:
+            attributes.append(('value', self.value))
+        if self.play_order:
+            attributes.append(('playOrder', self.play_order))
+        writer.start('navTarget', attributes)
+        _write_xml_labels(writer, 'navLabel', self.labels)
+        writer.element('content', [('src', self.src)])
+        writer.end('navTarget')
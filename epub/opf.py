@@ -12,8 +12,24 @@ OPF epub : http://idpf.org/epub/20/spec/OPF_2.0.1_draft.htm
 """
 
 
+import io
+import warnings
+
+from array import array
+from itertools import compress
 from xml.dom import minidom
 
+try:
+    from xml.etree import cElementTree as ElementTree
+except ImportError:
+    from xml.etree import ElementTree
+
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    # Python 2
+    from collections import MutableMapping
 
 try:
     # Only for Python 2.7+
@@ -27,14 +43,195 @@ except ImportError:
             'You should use Python 2.7 or install `ordereddict` from pypi.')
 
 
-from epub.utils import get_node_text
+from epub.utils import XMLNS_XML, XmlWriter, get_element_text, \
+                       get_node_text, split_tag
 
 
 XMLNS_DC = 'http://purl.org/dc/elements/1.1/'
 XMLNS_OPF = 'http://www.idpf.org/2007/opf'
 
+PARSER_MINIDOM = 'minidom'
+PARSER_ITERPARSE = 'iterparse'
+DEFAULT_PARSER = PARSER_ITERPARSE
+
+
+def parse_opf(xml_string, parser=None, manifest_class=None):
+    """Parse an OPF xml string and return an Opf object.
+
+    The `parser` argument select the backend used to read the xml:
+    `PARSER_ITERPARSE` (the default) reads the document in a single pass,
+    `PARSER_MINIDOM` builds a full DOM first, like older versions did.
+
+    The manifest is a `manifest_class` object: Manifest by default, or
+    ColumnarManifest for very large manifests.
+
+    """
+    parser = parser or DEFAULT_PARSER
+    if parser == PARSER_ITERPARSE:
+        return _parse_opf_iterparse(xml_string, manifest_class=manifest_class)
+    elif parser == PARSER_MINIDOM:
+        return _parse_opf_minidom(xml_string, manifest_class)
+    else:
+        raise ValueError('Unknown OPF parser: %s' % parser)
+
+
+def parse_opf_metadata(source):
+    """Parse only the <metadata> element of an OPF file.
+
+    `source` is the xml string or a file-like object opened in binary mode.
+    Reading stops as soon as </metadata> is found: manifest, spine and guide
+    of the returned Opf object are left empty.
+
+    """
+    return _parse_opf_iterparse(source, metadata_only=True)
 
-def parse_opf(xml_string):
+
+def _parse_opf_iterparse(source, metadata_only=False, manifest_class=None):
+    """Parse an OPF xml string in one pass with ElementTree.iterparse.
+
+    Each element is handled when it is closed, then removed from its parent,
+    so the tree is never fully built in memory. Dublin Core elements and
+    attributes are matched by namespace, not by prefix.
+
+    `source` can also be a file-like object. With `metadata_only`, parsing
+    stops at the end of the <metadata> element. The manifest is built with
+    `manifest_class` (Manifest by default).
+
+    """
+    if not hasattr(source, 'read'):
+        if not isinstance(source, bytes):
+            source = source.encode('utf-8')
+        source = io.BytesIO(source)
+
+    uid_id = ''
+    metadata = Metadata()
+    manifest = (manifest_class or Manifest)()
+    spine = Spine()
+    spine.toc = ''
+    guide = None
+
+    package = None
+    section = None
+    section_element = None
+    depth = 0
+    # Python 2 iterparse only accepts native strings as event names
+    events = ElementTree.iterparse(source, events=(str('start'), str('end')))
+    for event, element in events:
+        if event == 'start':
+            depth += 1
+            if depth == 1:
+                package = element
+                uid_id = element.get('unique-identifier', '')
+            elif depth == 2:
+                section_element = element
+                section = split_tag(element.tag)[1].lower()
+                if section == 'spine':
+                    spine.toc = element.get('toc', '')
+                elif section == 'guide':
+                    guide = Guide()
+            continue
+
+        depth -= 1
+        if depth == 1:
+            # End of metadata, manifest, spine or guide: drop its subtree
+            if metadata_only and section == 'metadata':
+                break
+            section = None
+            section_element = None
+            package.clear()
+            continue
+
+        namespace, name = split_tag(element.tag)
+        if section == 'metadata':
+            _parse_metadata_element(metadata, namespace, name, element)
+        elif section == 'manifest' and name == 'item':
+            manifest.add_item(element.get('id', ''),
+                              element.get('href', ''),
+                              element.get('media-type', ''),
+                              element.get('fallback', ''),
+                              element.get('required-namespace', ''),
+                              element.get('required-modules', ''),
+                              element.get('fallback-style', ''))
+        elif section == 'spine' and name == 'itemref':
+            spine.add_itemref(element.get('idref', ''),
+                              element.get('linear', '').lower() != 'no')
+        elif section == 'guide' and name == 'reference':
+            guide.add_reference(element.get('href', ''),
+                                element.get('type', ''),
+                                element.get('title', ''))
+        if depth == 2:
+            # A child of the section: its own children go with it
+            section_element.remove(element)
+
+    return Opf(uid_id=uid_id,
+               metadata=metadata,
+               manifest=manifest,
+               spine=spine,
+               guide=guide)
+
+
+_OPF_ROLE = '{%s}role' % XMLNS_OPF
+_OPF_FILE_AS = '{%s}file-as' % XMLNS_OPF
+_OPF_EVENT = '{%s}event' % XMLNS_OPF
+_OPF_SCHEME = '{%s}scheme' % XMLNS_OPF
+_XML_LANG = '{%s}lang' % XMLNS_XML
+
+
+def _parse_metadata_element(metadata, namespace, name, element):
+    """Store one closed xml.etree Element from <metadata> into `metadata`.
+
+    This is the single pass counterpart of `_parse_xml_metadata`: the same
+    tags and attributes are read, in document order.
+
+    """
+    if namespace != XMLNS_DC:
+        if name == 'meta':
+            metadata.add_meta(element.get('name', ''),
+                              element.get('content', ''))
+        return
+
+    if name == 'title':
+        metadata.add_title(get_element_text(element),
+                           element.get(_XML_LANG, ''))
+    elif name == 'creator':
+        metadata.add_creator(get_element_text(element),
+                             element.get(_OPF_ROLE, ''),
+                             element.get(_OPF_FILE_AS, ''))
+    elif name == 'subject':
+        metadata.add_subject(get_element_text(element))
+    elif name == 'description':
+        metadata.description = get_element_text(element)
+    elif name == 'publisher':
+        metadata.publisher = get_element_text(element)
+    elif name == 'contributor':
+        metadata.add_contributor(get_element_text(element),
+                                 element.get(_OPF_ROLE, ''),
+                                 element.get(_OPF_FILE_AS, ''))
+    elif name == 'date':
+        metadata.add_date(get_element_text(element),
+                          element.get(_OPF_EVENT, ''))
+    elif name == 'type':
+        metadata.dc_type = get_element_text(element)
+    elif name == 'format':
+        metadata.format = get_element_text(element)
+    elif name == 'identifier':
+        metadata.add_identifier(get_element_text(element),
+                                element.get('id', ''),
+                                element.get(_OPF_SCHEME, ''))
+    elif name == 'source':
+        metadata.source = get_element_text(element)
+    elif name == 'language':
+        metadata.add_language(get_element_text(element))
+    elif name == 'relation':
+        metadata.relation = get_element_text(element)
+    elif name == 'coverage':
+        metadata.coverage = get_element_text(element)
+    elif name == 'rights':
+        metadata.right = get_element_text(element)
+
+
+def _parse_opf_minidom(xml_string, manifest_class=None):
+    """Parse an OPF xml string through a full xml.dom.minidom Document."""
     package = minidom.parseString(xml_string).documentElement
 
     # Get Uid
@@ -56,7 +253,7 @@ def parse_opf(xml_string):
     metadata = _parse_xml_metadata(data['metadata'])
 
     # Inspect manifest
-    manifest = _parse_xml_manifest(data['manifest'])
+    manifest = _parse_xml_manifest(data['manifest'], manifest_class)
 
     # Inspect spine
     spine = _parse_xml_spine(data['spine'])
@@ -143,11 +340,11 @@ def _parse_xml_metadata(element):
     return metadata
 
 
-def _parse_xml_manifest(element):
+def _parse_xml_manifest(element, manifest_class=None):
     """Inspect an xml.dom.Element <manifest> and return a list of
     epub.EpubManifestItem object."""
 
-    manifest = Manifest()
+    manifest = (manifest_class or Manifest)()
     for e in element.getElementsByTagName('item'):
         manifest.add_item(e.getAttribute('id'),
                           e.getAttribute('href'),
@@ -181,6 +378,34 @@ def _parse_xml_guide(element):
     return guide
 
 
+def _role_attributes(role, file_as):
+    """Return opf:role and opf:file-as attributes of creator/contributor."""
+    attributes = []
+    if role:
+        attributes.append(('opf:role', role))
+    if file_as:
+        attributes.append(('opf:file-as', file_as))
+    return attributes
+
+
+def _item_attributes(identifier, href, media_type, fallback=None,
+                     required_namespace=None, required_modules=None,
+                     fallback_style=None):
+    """Return the attributes of a manifest <item> element."""
+    attributes = [('id', identifier), ('href', href)]
+    if media_type:
+        attributes.append(('media-type', media_type))
+    if fallback:
+        attributes.append(('fallback', fallback))
+    if required_namespace:
+        attributes.append(('required-namespace', required_namespace))
+    if required_modules:
+        attributes.append(('required-modules', required_modules))
+    if fallback_style:
+        attributes.append(('fallback-style', fallback_style))
+    return attributes
+
+
 class Opf(object):
     """Represent an OPF formated file.
 
@@ -222,6 +447,32 @@ class Opf(object):
         doc.appendChild(package)
         return doc
 
+    def write_to(self, fp):
+        """Write the OPF xml document to the binary file-like object `fp`.
+
+        Elements are written as they go, without building any xml tree: the
+        output is the same as `as_xml_document().toxml()` encoded in utf-8
+        (attributes are sorted by the writer where minidom sorts them).
+
+        """
+        writer = XmlWriter(fp)
+        writer.declaration()
+        writer.start('package', [('version', self.version),
+                                 ('unique-identifier', self.uid_id),
+                                 ('xmlns', self.xmlns)])
+        self.metadata.write_xml(writer)
+        self.manifest.write_xml(writer)
+        self.spine.write_xml(writer)
+        self.guide.write_xml(writer)
+        writer.end('package')
+        writer.flush()
+
+    def as_xml_string(self):
+        """Return the OPF xml document as utf-8 encoded bytes."""
+        fp = io.BytesIO()
+        self.write_to(fp)
+        return fp.getvalue()
+
 
 class Metadata(object):
     """Represent an epub's metadatas set.
@@ -391,8 +642,149 @@ class Metadata(object):
 
         return metadata
 
+    def write_xml(self, writer):
+        """Write the <metadata> element with an epub.utils.XmlWriter."""
+        attributes = [('xmlns:dc', XMLNS_DC), ('xmlns:opf', XMLNS_OPF)]
+        has_children = (self.titles or self.creators or self.subjects or
+                        self.description or self.publisher or
+                        self.contributors or self.dates or self.dc_type or
+                        self.format or self.identifiers or self.source or
+                        self.languages or self.relation or self.coverage or
+                        self.right or self.metas)
+        if not has_children:
+            writer.start('metadata', attributes, empty=True)
+            return
+        writer.start('metadata', attributes)
+
+        for text, lang in self.titles:
+            writer.element('dc:title',
+                           [('xml:lang', lang)] if lang else [], text)
+
+        for name, role, file_as in self.creators:
+            writer.element('dc:creator',
+                           _role_attributes(role, file_as), name)
+
+        for text in self.subjects:
+            writer.element('dc:subject', text=text)
+
+        if self.description:
+            writer.element('dc:description', text=self.description)
+
+        if self.publisher:
+            writer.element('dc:publisher', text=self.publisher)
+
+        for name, role, file_as in self.contributors:
+            writer.element('dc:contributor',
+                           _role_attributes(role, file_as), name)
+
+        for text, event in self.dates:
+            writer.element('dc:date',
+                           [('opf:event', event)] if event else [], text)
+
+        if self.dc_type:
+            writer.element('dc:type', text=self.dc_type)
+
+        if self.format:
+            writer.element('dc:format', text=self.format)
+
+        for text, identifier, scheme in self.identifiers:
+            attributes = []
+            if identifier:
+                attributes.append(('id', identifier))
+            if scheme:
+                attributes.append(('opf:scheme', scheme))
+            writer.element('dc:identifier', attributes, text)
+
+        if self.source:
+            writer.element('dc:source', text=self.source)
+
+        for text in self.languages:
+            writer.element('dc:language', text=text)
+
+        if self.relation:
+            writer.element('dc:relation', text=self.relation)
+
+        if self.coverage:
+            writer.element('dc:coverage', text=self.coverage)
+
+        if self.right:
+            writer.element('dc:rights', text=self.right)
+
+        for name, content in self.metas:
+            writer.element('meta', [('name', name), ('content', content)])
+
+        writer.end('metadata')
+
+
+class _HrefIndex(object):
+    """Index of manifest items by href, for `get_by_href`.
+
+    Two items should not share the same href, but some epub files do: such
+    items are accepted with a warning, and their href is then ambiguous,
+    until only one of them is left.
+
+    """
+
+    def __init__(self):
+        # href -> identifier, and href -> identifiers of an ambiguous href
+        self._keys = {}
+        self._shared = {}
+
+    def add(self, href, key):
+        if not href:
+            return
+        shared = self._shared.get(href)
+        if shared is not None:
+            shared.add(key)
+            return
+        owner = self._keys.setdefault(href, key)
+        if owner != key:
+            warnings.warn('Items %s and %s have the same href "%s".'
+                          % (owner, key, href), SyntaxWarning)
+            del self._keys[href]
+            self._shared[href] = set([owner, key])
+
+    def remove(self, href, key):
+        shared = self._shared.get(href)
+        if shared is not None:
+            shared.discard(key)
+            if len(shared) == 1:
+                self._keys[href] = shared.pop()
+                del self._shared[href]
+        elif self._keys.get(href) == key:
+            del self._keys[href]
+
+    def get(self, href):
+        """Return the identifier of the item with this href, or None.
+
+        Raise a LookupError if several items have this href.
+
+        """
+        if href in self._shared:
+            raise LookupError('Multiple items are found with this href.')
+        return self._keys.get(href)
+
+    def clear(self):
+        self._keys.clear()
+        self._shared.clear()
+
 
 class Manifest(OrderedDict):
+    """Represent the epub's manifest: a dict of ManifestItem by identifier.
+
+    A reverse index of items by href is kept up to date, so `get_by_href` does
+    not need to look at every item. Items sharing the same href are accepted
+    with a warning, but `get_by_href` then raises a LookupError for it.
+
+    The href of an item must not be changed while the item is in a manifest.
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        # href index, and identifier -> indexed href
+        self._href_index = _HrefIndex()
+        self._indexed_hrefs = {}
+        super(Manifest, self).__init__(*args, **kwargs)
 
     def __contains__(self, item):
         if hasattr(item, 'identifier'):
@@ -404,6 +796,10 @@ class Manifest(OrderedDict):
         if hasattr(value, 'identifier') and hasattr(value, 'href'):
             if value.identifier == key:
                 super(Manifest, self).__setitem__(key, value)
+                self._unindex(key)
+                if value.href:
+                    self._href_index.add(value.href, key)
+                    self._indexed_hrefs[key] = value.href
             else:
                 raise ValueError('Value\'s id is different from insert key.')
         else:
@@ -411,6 +807,264 @@ class Manifest(OrderedDict):
             msg = 'Value does not fit the requirement (%s).' % requierements
             raise ValueError(msg)
 
+    def __delitem__(self, key):
+        super(Manifest, self).__delitem__(key)
+        self._unindex(key)
+
+    def pop(self, key, *default):
+        value = super(Manifest, self).pop(key, *default)
+        self._unindex(key)
+        return value
+
+    def popitem(self, last=True):
+        key, value = super(Manifest, self).popitem(last)
+        self._unindex(key)
+        return (key, value)
+
+    def clear(self):
+        super(Manifest, self).clear()
+        self._href_index.clear()
+        self._indexed_hrefs.clear()
+
+    def _unindex(self, key):
+        href = self._indexed_hrefs.pop(key, None)
+        if href is not None:
+            self._href_index.remove(href, key)
+
+    def get_by_href(self, href, default=None):
+        """Return the item with this href, or `default` if there is none.
+
+        Raise a LookupError if several items have this href.
+
+        """
+        key = self._href_index.get(href)
+        if key is None:
+            return default
+        return self[key]
+
+    def get_by_media_type(self, media_type):
+        """Return the list of items with this media type."""
+        return [item for item in self.values()
+                     if item.media_type == media_type]
+
+    def get_hrefs(self, media_type=None):
+        """Return the list of hrefs of items (with this media type, if any).
+        """
+        return [item.href for item in self.values()
+                          if media_type is None or
+                             item.media_type == media_type]
+
+    def add_item(self, identifier, href, media_type=None, fallback=None,
+                 required_namespace=None, required_modules=None,
+                 fallback_style=None):
+        item = ManifestItem(identifier, href, media_type,
+                            fallback, required_namespace, required_modules,
+                            fallback_style)
+        self.append(item)
+
+    def append(self, item):
+        if hasattr(item, 'identifier') and \
+           hasattr(item, 'href') and \
+           hasattr(item, 'as_xml_element'):
+            self.__setitem__(item.identifier, item)
+        else:
+            raise ValueError('Manifest item must have [identifier, href, ' + \
+                             'as_xml_element()] attributes and method.')
+
+    def as_xml_element(self):
+        """Return an xml dom Element node."""
+        doc = minidom.Document()
+        manifest = doc.createElement('manifest')
+
+        for item in self.values():
+            manifest.appendChild(item.as_xml_element())
+
+        return manifest
+
+    def write_xml(self, writer):
+        """Write the <manifest> element with an epub.utils.XmlWriter.
+
+        Items without a `write_xml` method are written from their
+        `as_xml_element()`.
+
+        """
+        if not self:
+            writer.start('manifest', empty=True)
+            return
+        writer.start('manifest')
+        for item in self.values():
+            if hasattr(item, 'write_xml'):
+                item.write_xml(writer)
+            else:
+                writer.write(item.as_xml_element().toxml())
+        writer.end('manifest')
+
+
+class ColumnarManifest(MutableMapping):
+    """Represent the epub's manifest in columns, for very large manifests.
+
+    It works like a Manifest (a mapping of ManifestItem by identifier, with
+    the same methods), but items are not kept as objects: identifiers and
+    hrefs are stored in two lists, and media types as codes in an array,
+    each distinct media type being stored once. Other attributes, seldom
+    used, are stored apart (and their empty values are read as None).
+
+    A new ManifestItem is built each time an item is read from the manifest:
+    changing it does not change the manifest, unless it is set again.
+    Removing an item takes a time proportional to the size of the manifest.
+
+    """
+
+    def __init__(self, items=()):
+        self._identifiers = []
+        self._href_column = []
+        self._media_type_codes = array(str('I'))
+        # code -> media type, and media type -> code
+        self._media_types = []
+        self._codes = {}
+        # identifier -> (fallback, required_namespace, required_modules,
+        #                fallback_style), only when one of them is set
+        self._extras = {}
+        # identifier -> position, and href index
+        self._positions = {}
+        self._href_index = _HrefIndex()
+        for item in items:
+            self.append(item)
+
+    def __len__(self):
+        return len(self._identifiers)
+
+    def __iter__(self):
+        return iter(self._identifiers)
+
+    def __contains__(self, item):
+        if hasattr(item, 'identifier'):
+            return item.identifier in self._positions
+        else:
+            return item in self._positions
+
+    def __getitem__(self, key):
+        return self._build_item(self._positions[key])
+
+    def __setitem__(self, key, value):
+        if not (hasattr(value, 'identifier') and hasattr(value, 'href')):
+            requierements = 'id and href attributes'
+            msg = 'Value does not fit the requirement (%s).' % requierements
+            raise ValueError(msg)
+        if value.identifier != key:
+            raise ValueError('Value\'s id is different from insert key.')
+
+        media_type = getattr(value, 'media_type', None)
+        code = self._codes.get(media_type)
+        if code is None:
+            code = len(self._media_types)
+            self._media_types.append(media_type)
+            self._codes[media_type] = code
+
+        position = self._positions.get(key)
+        if position is None:
+            self._positions[key] = len(self._identifiers)
+            self._identifiers.append(key)
+            self._href_column.append(value.href)
+            self._media_type_codes.append(code)
+        else:
+            self._unindex(position)
+            self._href_column[position] = value.href
+            self._media_type_codes[position] = code
+        self._href_index.add(value.href, key)
+
+        extras = (getattr(value, 'fallback', None),
+                  getattr(value, 'required_namespace', None),
+                  getattr(value, 'required_modules', None),
+                  getattr(value, 'fallback_style', None))
+        if any(extras):
+            self._extras[key] = extras
+        else:
+            self._extras.pop(key, None)
+
+    def __delitem__(self, key):
+        position = self._positions.pop(key)
+        self._unindex(position)
+        del self._identifiers[position]
+        del self._href_column[position]
+        del self._media_type_codes[position]
+        self._extras.pop(key, None)
+        for index in range(position, len(self._identifiers)):
+            self._positions[self._identifiers[index]] = index
+
+    def clear(self):
+        self.__init__()
+
+    def __eq__(self, other):
+        """Compare the items of two manifests by value, in order.
+
+        Items are built again each time they are read, so they can not be
+        compared as objects: columns are compared instead.
+
+        """
+        if not isinstance(other, ColumnarManifest):
+            return NotImplemented
+        return (self._identifiers == other._identifiers and
+                self._href_column == other._href_column and
+                self._media_type_column() == other._media_type_column() and
+                self._extras == other._extras)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    def _media_type_column(self):
+        return [self._media_types[code] for code in self._media_type_codes]
+
+    def _unindex(self, position):
+        self._href_index.remove(self._href_column[position],
+                                self._identifiers[position])
+
+    def _build_item(self, position):
+        identifier = self._identifiers[position]
+        media_type = self._media_types[self._media_type_codes[position]]
+        extras = self._extras.get(identifier, ())
+        return ManifestItem(identifier, self._href_column[position],
+                            media_type, *extras)
+
+    def _positions_of(self, media_type):
+        """Return the positions of items with this media type."""
+        code = self._codes.get(media_type)
+        if code is None:
+            return []
+        return compress(range(len(self._identifiers)),
+                        [c == code for c in self._media_type_codes])
+
+    def get_by_href(self, href, default=None):
+        """Return the item with this href, or `default` if there is none.
+
+        Raise a LookupError if several items have this href.
+
+        """
+        key = self._href_index.get(href)
+        if key is None:
+            return default
+        return self[key]
+
+    def get_by_media_type(self, media_type):
+        """Return the list of items with this media type."""
+        return [self._build_item(position)
+                for position in self._positions_of(media_type)]
+
+    def get_hrefs(self, media_type=None):
+        """Return the list of hrefs of items (with this media type, if any).
+
+        No ManifestItem is built: only the href and media type columns are
+        read.
+
+        """
+        if media_type is None:
+            return list(self._href_column)
+        return [self._href_column[position]
+                for position in self._positions_of(media_type)]
+
     def add_item(self, identifier, href, media_type=None, fallback=None,
                  required_namespace=None, required_modules=None,
                  fallback_style=None):
@@ -438,13 +1092,36 @@ class Manifest(OrderedDict):
 
         return manifest
 
+    def write_xml(self, writer):
+        """Write the <manifest> element with an epub.utils.XmlWriter.
+
+        Items are written from the columns, without building any ManifestItem.
+
+        """
+        if not self:
+            writer.start('manifest', empty=True)
+            return
+        writer.start('manifest')
+        for position, identifier in enumerate(self._identifiers):
+            media_type = self._media_types[self._media_type_codes[position]]
+            writer.element('item', _item_attributes(
+                identifier, self._href_column[position], media_type,
+                *self._extras.get(identifier, ())))
+        writer.end('manifest')
+
 
 class ManifestItem(object):
     """
     Represent an item from the epub's manifest.
 
+    Items use __slots__ instead of an instance dict: manifests of many epub
+    files may be kept in memory at once.
+
     """
 
+    __slots__ = ('identifier', 'href', 'media_type', 'fallback',
+                 'required_namespace', 'required_modules', 'fallback_style')
+
     def __init__(self, identifier, href, media_type=None, fallback=None,
                  required_namespace=None, required_modules=None,
                  fallback_style=None):
@@ -476,6 +1153,13 @@ class ManifestItem(object):
 
         return item
 
+    def write_xml(self, writer):
+        """Write the <item> element with an epub.utils.XmlWriter."""
+        writer.element('item', _item_attributes(
+            self.identifier, self.href, self.media_type, self.fallback,
+            self.required_namespace, self.required_modules,
+            self.fallback_style))
+
 
 class Spine(object):
 
@@ -506,6 +1190,21 @@ class Spine(object):
 
         return spine
 
+    def write_xml(self, writer):
+        """Write the <spine> element with an epub.utils.XmlWriter."""
+        attributes = [('toc', self.toc)]
+        if not self.itemrefs:
+            writer.start('spine', attributes, empty=True)
+            return
+        writer.start('spine', attributes)
+        for idref, linear in self.itemrefs:
+            if linear:
+                writer.element('itemref', [('idref', idref)])
+            else:
+                writer.element('itemref', [('idref', idref),
+                                           ('linear', 'no')])
+        writer.end('spine')
+
 
 class Guide(object):
 
@@ -533,3 +1232,19 @@ class Guide(object):
             guide.appendChild(reference)
 
         return guide
+
+    def write_xml(self, writer):
+        """Write the <guide> element with an epub.utils.XmlWriter."""
+        if not self.references:
+            writer.start('guide', empty=True)
+            return
+        writer.start('guide')
+        for href, ref_type, title in self.references:
+            # As in as_xml_element, "type" is always written
+            attributes = [('type', ref_type)]
+            if title:
+                attributes.append(('title', title))
+            if href:
+                attributes.append(('href', href))
+            writer.element('reference', attributes)
+        writer.end('guide')
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+"""
+In-process cache of opened epub files, shared between threads.
+
+Opening an epub reads its zip central directory and parses its OPF and NCX
+files. A service reading items from the same epub files again and again can
+keep them open in an `EpubPool`:
+
+    pool = EpubPool(max_size=64)
+
+    with pool.open('path/to/my.epub') as book:
+        print book.read_item('Text/cover.xhtml')
+
+    # or, for a single read
+    content = pool.read_item('path/to/my.epub', 'Text/cover.xhtml')
+
+Epub files are opened read-only. When a file changes on disk (size or
+modification time), its handle is replaced by a new one.
+
+The same EpubFile can be used by many threads at once: zipfile.ZipFile holds
+a lock while it reads its shared file object.
+"""
+
+
+import contextlib
+import os
+import threading
+
+try:
+    # Only for Python 2.7+
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+import epub
+
+
+DEFAULT_MAX_SIZE = 32
+
+
+class EpubPool(object):
+    """Bounded, least recently used cache of read-only EpubFile objects.
+
+    At most `max_size` epub files are kept open. A handle evicted (or
+    replaced because its file changed) while still used is closed only when
+    its last user releases it. Other keyword arguments are given to
+    `epub.open_epub` (eg. `lazy_toc` or `cache`).
+
+    """
+
+    def __init__(self, max_size=None, **options):
+        self.max_size = max_size or DEFAULT_MAX_SIZE
+        self.options = options
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._handles)
+
+    def __contains__(self, filename):
+        return os.path.abspath(filename) in self._handles
+
+    @contextlib.contextmanager
+    def open(self, filename):
+        """Return a context manager giving the shared EpubFile of `filename`.
+
+        The EpubFile must not be closed, nor used once the `with` block is
+        left.
+
+        """
+        handle = self._acquire(filename)
+        try:
+            yield handle.epub_file
+        finally:
+            self._release(handle)
+
+    def read_item(self, filename, item):
+        """Read an item of the epub file `filename` (see EpubFile.read_item).
+        """
+        with self.open(filename) as epub_file:
+            return epub_file.read_item(item)
+
+    def invalidate(self, filename):
+        """Remove the handle of `filename` from the pool, if any."""
+        with self._lock:
+            handle = self._handles.pop(os.path.abspath(filename), None)
+            if handle is not None:
+                self._discard(handle)
+
+    def close(self):
+        """Remove every handle from the pool."""
+        with self._lock:
+            while self._handles:
+                self._discard(self._handles.popitem()[1])
+
+    def _acquire(self, filename):
+        key = os.path.abspath(filename)
+        signature = _signature(key)
+
+        with self._lock:
+            handle = self._handles.pop(key, None)
+            if handle is not None:
+                if handle.signature == signature:
+                    # Move it at the end: it is the most recently used
+                    self._handles[key] = handle
+                    handle.users += 1
+                    return handle
+                self._discard(handle)
+
+        # Open the file without holding the lock: other epub files of the
+        # pool are still available in the meantime.
+        handle = _Handle(epub.open_epub(key, 'r', **self.options), signature)
+
+        with self._lock:
+            current = self._handles.get(key)
+            if current is not None and current.signature == signature:
+                # Another thread opened the same file first: use its handle
+                handle.epub_file.close()
+                handle = current
+            else:
+                if current is not None:
+                    self._discard(current)
+                self._handles[key] = handle
+                while len(self._handles) > self.max_size:
+                    self._discard(self._handles.popitem(last=False)[1])
+            handle.users += 1
+            return handle
+
+    def _release(self, handle):
+        with self._lock:
+            handle.users -= 1
+            if handle.stale and handle.users == 0:
+                handle.epub_file.close()
+
+    def _discard(self, handle):
+        """Close a handle removed from the pool, once it is not used anymore.
+
+        Must be called with the lock held.
+
+        """
+        handle.stale = True
+        if handle.users == 0:
+            handle.epub_file.close()
+
+
+class _Handle(object):
+    """An EpubFile of the pool, with its users count."""
+
+    def __init__(self, epub_file, signature):
+        self.epub_file = epub_file
+        self.signature = signature
+        self.users = 0
+        self.stale = False
+
+
+def _signature(filename):
+    """Return what tells if a file has changed: its size and mtime."""
+    stat = os.stat(filename)
+    return (stat.st_size, stat.st_mtime)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+"""
+Opt-in timings and counters of the stages of an epub file.
+
+An `EpubStats` object given to `epub.open_epub` records, for each stage of
+the epub file (reading the zip central directory, container.xml, the OPF and
+NCX files, each `read_item`, and the generated files written on close), its
+wall time, the bytes read, decompressed and written, and the count of parsed
+elements:
+
+    stats = EpubStats()
+    with epub.open_epub('path/to/my.epub', stats=stats) as book:
+        book.read_item('Text/cover.xhtml')
+    print stats.as_dict()['opf']['time']
+
+The same object can be shared by many epub files (and threads): totals are
+summed by stage name. A `callback` receives each measure as it is recorded,
+eg. to send it to a metrics system.
+
+An epub file opened without stats does not measure anything.
+"""
+
+
+import threading
+import time
+
+try:
+    timer = time.perf_counter
+except AttributeError:
+    # Python 2
+    timer = time.time
+
+
+FIELDS = ('time', 'bytes_read', 'bytes_decompressed', 'bytes_written',
+          'elements')
+
+
+class EpubStats(object):
+    """Timings and counters of epub file stages, summed by stage name.
+
+    `callback`, if given, is called as `callback(name, measure)` each time a
+    stage is recorded, where `measure` is a dict with the keys of `FIELDS`.
+
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def stage(self, name):
+        """Return a context manager measuring one run of stage `name`."""
+        return Stage(self, name)
+
+    def record(self, name, **measure):
+        """Add one run of stage `name` to its totals.
+
+        Fields of `FIELDS` that are not given count as 0. Other counters
+        (eg. `hits` and `misses` of the cache stage) are summed as well.
+
+        """
+        for field in FIELDS:
+            measure.setdefault(field, 0)
+        with self._lock:
+            totals = self._totals.get(name)
+            if totals is None:
+                totals = self._totals[name] = {'calls': 0}
+            totals['calls'] += 1
+            for field, value in measure.items():
+                totals[field] = totals.get(field, 0) + value
+        if self.callback is not None:
+            self.callback(name, measure)
+
+    def as_dict(self):
+        """Return the totals of each stage, as a dict of dicts.
+
+        Each stage has a `calls` count, its total `time` (in seconds) and the
+        totals of its other counters.
+
+        """
+        with self._lock:
+            return dict((name, dict(totals))
+                        for name, totals in self._totals.items())
+
+    def reset(self):
+        """Remove every recorded total."""
+        with self._lock:
+            self._totals.clear()
+
+
+class Stage(object):
+    """Measure one run of a stage, recorded in an EpubStats on exit.
+
+    Counters are added with `add` while the stage runs. A stage that raises
+    an exception is not recorded.
+
+    """
+    __slots__ = ('stats', 'name', 'counters', 'start')
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+        self.counters = {}
+        self.start = None
+
+    def __enter__(self):
+        self.start = timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.stats.record(self.name, time=timer() - self.start,
+                              **self.counters)
+        return False
+
+    def add(self, **counters):
+        """Add to the counters (eg. `bytes_read`) of this run."""
+        for field, value in counters.items():
+            self.counters[field] = self.counters.get(field, 0) + value
+
+    def add_member(self, info):
+        """Add the sizes of a zip member (a zipfile.ZipInfo) as read."""
+        self.add(bytes_read=info.compress_size,
+                 bytes_decompressed=info.file_size)
+
+
+class _NullStage(object):
+    """Stage of an epub file opened without stats: measures nothing."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def add(self, **counters):
+        pass
+
+    def add_member(self, info):
+        pass
+
+
+NULL_STAGE = _NullStage()
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+"""
+Pluggable tracing of epub files: spans for opening, reading and decompressing.
+
+Epub files report spans to a tracer: "open book" (EpubFile), "read chapter"
+and "resolve chapter" (BookChapter.read and Book.chapters), "read member"
+(EpubFile.read_item) and "decompress" (inflating a member). Their attributes
+give the member path, its compressed and uncompressed sizes, or the cache
+hit/miss of an open, so that latency outliers can be traced to members.
+
+The default tracer does nothing. A tracer is any object with a
+`span(name, attributes)` method returning a context manager, whose value has
+a `set_attribute(key, value)` method. This is the API of OpenTelemetry
+tracers, for example:
+
+    class OpenTelemetryTracer(Tracer):
+        def __init__(self, tracer):
+            self.tracer = tracer
+
+        def span(self, name, attributes=None):
+            return self.tracer.start_as_current_span(name,
+                                                     attributes=attributes)
+
+    epub.tracing.set_tracer(OpenTelemetryTracer(trace.get_tracer('epub')))
+
+A tracer can also be given to a single epub file (see `epub.open_epub`).
+Spans are nested in the order they are entered: a tracer is in charge of its
+own context propagation (`RecordingTracer` uses a per-thread stack).
+"""
+
+
+import threading
+
+from .stats import timer
+
+
+class Tracer(object):
+    """Base class of tracers: its spans do nothing."""
+
+    def span(self, name, attributes=None):
+        """Return a context manager for the span `name`."""
+        return NULL_SPAN
+
+
+class _NullSpan(object):
+    """Span of the default tracer: records nothing."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+_tracer = Tracer()
+
+
+def get_tracer():
+    """Return the tracer used by epub files opened without a tracer."""
+    return _tracer
+
+
+def set_tracer(tracer):
+    """Set the tracer used by epub files opened without a tracer.
+
+    With None, the default tracer (which does nothing) is used again.
+
+    """
+    global _tracer
+    _tracer = tracer if tracer is not None else Tracer()
+
+
+class RecordingTracer(Tracer):
+    """Tracer keeping every finished span in its `spans` list.
+
+    The parent of a span is the innermost span still open in the same thread.
+    It is meant for tests and debugging.
+
+    """
+
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def span(self, name, attributes=None):
+        return RecordedSpan(self, name, attributes)
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _finish(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+
+class RecordedSpan(object):
+    """Span of a RecordingTracer, with its parent span and duration.
+
+    A span left by an exception has an `error` attribute, the exception
+    repr.
+
+    """
+
+    def __init__(self, tracer, name, attributes=None):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.parent = None
+        self.start = None
+        self.end = None
+
+    @property
+    def duration(self):
+        """Return the duration of a finished span, in seconds."""
+        return self.end - self.start
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        if stack:
+            self.parent = stack[-1]
+        stack.append(self)
+        self.start = timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.end = timer()
+        self.tracer._stack().pop()
+        if exc_type is not None:
+            self.attributes['error'] = repr(exc_value)
+        self.tracer._finish(self)
+        return False
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
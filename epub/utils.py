@@ -2,6 +2,18 @@
 from __future__ import unicode_literals
 
 
+import sys
+
+
+XMLNS_XML = 'http://www.w3.org/XML/1998/namespace'
+
+XML_DECLARATION = '<?xml version="1.0" ?>'
+
+# xml.dom.minidom writes attributes sorted by name before Python 3.8, and in
+# their order of creation since.
+MINIDOM_SORTS_ATTRIBUTES = sys.version_info < (3, 8)
+
+
 def get_node_text(node):
     """
     Return the text content of an xml.dom Element Node.
@@ -17,6 +29,40 @@ def get_node_text(node):
     return text
 
 
+def get_element_text(element):
+    """
+    Return the text content of an xml.etree Element.
+
+    This is the ElementTree counterpart of `get_node_text`: if element does
+    not have content, this function return an empty string.
+    """
+    text = ''
+
+    if element.text:
+        text = element.text.strip()
+
+    return text
+
+
+def split_tag(tag):
+    """
+    Return a tuple (namespace, local name) from an xml.etree Element's tag.
+
+    ElementTree stores qualified tags as `{namespace}local`; namespace is an
+    empty string when the tag has none.
+
+    eg.:
+
+        ns, name = split_tag('{http://purl.org/dc/elements/1.1/}title')
+        print ns # 'http://purl.org/dc/elements/1.1/'
+        print name # 'title'
+    """
+    if tag[:1] == '{':
+        namespace, name = tag[1:].split('}', 1)
+        return (namespace, name)
+    return ('', tag)
+
+
 def get_urlpath_part(urlpath):
     """
     Return a path without url fragment (something like `#frag` at the end).
@@ -36,3 +82,89 @@ def get_urlpath_part(urlpath):
     if urlpath.count('#'):
         href, fragment = urlpath.split('#')
     return (href, fragment)
+
+
+def escape_xml_data(data):
+    """
+    Return data escaped for an xml text node or attribute value.
+
+    Characters are escaped as xml.dom.minidom does when writing a document
+    (&, <, " and >), and None is written as an empty string.
+    """
+    if not data:
+        return ''
+    return data.replace('&', '&amp;').replace('<', '&lt;'). \
+                replace('"', '&quot;').replace('>', '&gt;')
+
+
+class XmlWriter(object):
+    """
+    Write xml elements to a binary file-like object.
+
+    The output is the same as the `toxml()` method of an xml.dom.minidom
+    Document holding the same elements, encoded with `encoding`: with
+    `sort_attributes` (the default before Python 3.8, like minidom),
+    attributes are sorted by name. Written data is buffered up to
+    `buffer_size` characters.
+
+    eg.:
+
+        writer = XmlWriter(fp)
+        writer.declaration()
+        writer.start('package', [('version', '2.0')])
+        writer.element('item', [('id', 'ncx')])
+        writer.end('package')
+        writer.flush()
+    """
+
+    def __init__(self, fp, encoding='utf-8', buffer_size=64 * 1024,
+                 sort_attributes=MINIDOM_SORTS_ATTRIBUTES):
+        self.fp = fp
+        self.encoding = encoding
+        self.buffer_size = buffer_size
+        self.sort_attributes = sort_attributes
+        self._chunks = []
+        self._size = 0
+
+    def write(self, data):
+        """Write raw (already escaped) data."""
+        self._chunks.append(data)
+        self._size += len(data)
+        if self._size >= self.buffer_size:
+            self.flush()
+
+    def declaration(self):
+        self.write(XML_DECLARATION)
+
+    def start(self, tag, attributes=(), empty=False):
+        """Write a start tag, or an empty element tag if `empty`.
+
+        `attributes` is a list of (name, value) tuples, written in this order
+        unless `sort_attributes` is set.
+        """
+        if self.sort_attributes:
+            attributes = sorted(attributes)
+        self.write('<' + tag)
+        for name, value in attributes:
+            self.write(' %s="%s"' % (name, escape_xml_data(value)))
+        self.write('/>' if empty else '>')
+
+    def end(self, tag):
+        self.write('</%s>' % tag)
+
+    def element(self, tag, attributes=(), text=None):
+        """Write a whole element, with a text content if `text` is not None.
+        """
+        if text is None:
+            self.start(tag, attributes, empty=True)
+        else:
+            self.start(tag, attributes)
+            self.write(escape_xml_data(text))
+            self.end(tag)
+
+    def flush(self):
+        """Write buffered data to the file-like object."""
+        if self._chunks:
+            self.fp.write(''.join(self._chunks).encode(self.encoding))
+            self._chunks = []
+            self._size = 0
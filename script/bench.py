@@ -0,0 +1,473 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark the open, parse and serialize paths of the epub library.
+
+Run it from the root of the repository (or with script/bench.sh):
+
+    python script/bench.py [options] [scenario ...]
+
+Each scenario is a synthetic epub file, built in a temporary directory with
+the same content on every run: its manifest size, the depth and fan-out of
+its TOC, and the count and size of its members can be set from the command
+line (see --help). Each stage is run --repeat times and its best time is
+kept; its peak memory is measured on one more run, with tracemalloc (Python
+3.4+ only).
+
+Results can be saved with --save, and compared with a saved baseline with
+--compare: the script then exits with status 1 if a stage is slower, or uses
+more memory, than the baseline by more than --tolerance.
+"""
+from __future__ import division, print_function, unicode_literals
+
+
+import argparse
+import gc
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    timer = time.perf_counter
+except AttributeError:
+    timer = time.time
+
+import epub
+from epub import ncx, opf
+
+
+# name: (items, members, member_size, toc_depth, toc_fanout)
+SCENARIOS = {
+    'small': (20, 20, 4096, 2, 4),
+    'large-manifest': (10000, 200, 1024, 1, 50),
+    'deep-toc': (200, 200, 1024, 6, 4),
+    'large-members': (40, 40, 1024 * 1024, 1, 40),
+}
+
+DEFAULT_SCENARIOS = ['small', 'large-manifest', 'deep-toc', 'large-members']
+
+STAGES = ['open', 'parse_opf', 'parse_toc', 'as_xml_document', 'read_items',
+          'read_items_threads', 'write_close']
+
+# Threads of the read_items_threads stage
+THREADS = 4
+
+# Members are written with a fixed date, so that archives are identical
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+UID = 'urn:uuid:00000000-0000-4000-8000-000000000000'
+
+WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do '
+         'eiusmod tempor incididunt ut labore et dolore magna aliqua enim ad '
+         'minim veniam quis nostrud exercitation ullamco laboris nisi aliquip '
+         'ex ea commodo consequat').split()
+
+CONTAINER_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+    <rootfiles>
+        <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+    </rootfiles>
+</container>"""
+
+
+# Synthetic epub files
+
+def item_href(index):
+    return 'Text/item%05d.xhtml' % index
+
+
+def build_member(index, size):
+    """Return the content of a member, as `size` bytes of XHTML.
+
+    Its words follow a fixed sequence, so that its content (and its
+    compression ratio) is the same on every run.
+    """
+    head = ('<?xml version="1.0" encoding="utf-8"?>\n'
+            '<html xmlns="http://www.w3.org/1999/xhtml">'
+            '<head><title>Item %d</title></head><body>\n' % index)
+    tail = '</body></html>\n'
+    parts = [head]
+    length = len(head) + len(tail)
+    word = index
+    while length < size:
+        line = '<p id="p%d">%s</p>\n' % (
+            word, ' '.join(WORDS[(word * 7 + i * 13) % len(WORDS)]
+                           for i in range(12)))
+        parts.append(line)
+        length += len(line)
+        word += 1
+    parts.append(tail)
+    return ''.join(parts).encode('utf-8')
+
+
+def build_opf(items):
+    """Return the content of an OPF file with `items` manifest items."""
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<package xmlns="http://www.idpf.org/2007/opf" '
+             'unique-identifier="BookId" version="2.0">',
+             '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/" '
+             'xmlns:opf="http://www.idpf.org/2007/opf">',
+             '<dc:identifier id="BookId" opf:scheme="uuid">%s</dc:identifier>'
+             % UID,
+             '<dc:title>Benchmark</dc:title>',
+             '<dc:creator opf:role="aut">Benchmark</dc:creator>',
+             '<dc:language>en</dc:language>',
+             '</metadata>',
+             '<manifest>',
+             '<item id="ncx" href="toc.ncx" '
+             'media-type="application/x-dtbncx+xml"/>']
+    for i in range(items):
+        lines.append('<item id="item%05d" href="%s" '
+                     'media-type="application/xhtml+xml"/>'
+                     % (i, item_href(i)))
+    lines.append('</manifest>')
+    lines.append('<spine toc="ncx">')
+    for i in range(items):
+        lines.append('<itemref idref="item%05d"/>' % i)
+    lines.append('</spine>')
+    lines.append('</package>')
+    return '\n'.join(lines).encode('utf-8')
+
+
+def build_ncx(items, depth, fanout):
+    """Return the content of an NCX file.
+
+    Its navMap is a complete tree of navPoints, `depth` levels deep, with
+    `fanout` children for each navPoint. navPoints point to the `items`
+    manifest items in turn, with a fragment below the first level.
+    """
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" '
+             'version="2005-1">',
+             '<head><meta content="%s" name="dtb:uid"/></head>' % UID,
+             '<docTitle><text>Benchmark</text></docTitle>',
+             '<navMap>']
+    counter = [0]
+
+    def add_points(level):
+        for _ in range(fanout):
+            order = counter[0] = counter[0] + 1
+            src = item_href(order % max(items, 1))
+            if level > 1:
+                src += '#p%d' % order
+            lines.append('<navPoint id="nav%d" playOrder="%d">'
+                         '<navLabel><text>Point %d</text></navLabel>'
+                         '<content src="%s"/>' % (order, order, order, src))
+            if level < depth:
+                add_points(level + 1)
+            lines.append('</navPoint>')
+
+    if depth > 0:
+        add_points(1)
+    lines.append('</navMap>')
+    lines.append('</ncx>')
+    return '\n'.join(lines).encode('utf-8')
+
+
+def build_epub(path, items, members, member_size, toc_depth, toc_fanout,
+               compression=zipfile.ZIP_DEFLATED):
+    """Write a synthetic epub file to `path`.
+
+    Its manifest has `items` XHTML items: the first `members` of them are
+    `member_size` bytes long, the others are stubs of a few bytes.
+    """
+    def write(archive, name, data, compress_type=compression):
+        info = zipfile.ZipInfo(name, ZIP_DATE_TIME)
+        info.compress_type = compress_type
+        info.external_attr = 0o644 << 16
+        archive.writestr(info, data)
+
+    with zipfile.ZipFile(path, 'w') as archive:
+        write(archive, 'mimetype', epub.MIMETYPE_EPUB.encode('ascii'),
+              zipfile.ZIP_STORED)
+        write(archive, 'META-INF/container.xml', CONTAINER_XML.encode('utf-8'))
+        write(archive, 'OEBPS/content.opf', build_opf(items))
+        write(archive, 'OEBPS/toc.ncx', build_ncx(items, toc_depth, toc_fanout))
+        for i in range(items):
+            size = member_size if i < members else 0
+            write(archive, 'OEBPS/' + item_href(i), build_member(i, size))
+
+
+# Stages: each one is a (setup, run) pair of functions. `setup(context)`
+# returns the argument of `run`, and is not measured.
+
+def setup_path(context):
+    return context['path']
+
+
+def run_open(path):
+    epub.open_epub(path).close()
+
+
+def setup_opf_bytes(context):
+    with epub.open_epub(context['path']) as epub_file:
+        return epub_file.read(epub_file.opf_path)
+
+
+def run_parse_opf(data):
+    opf.parse_opf(data)
+
+
+def setup_ncx_bytes(context):
+    with epub.open_epub(context['path']) as epub_file:
+        return epub_file.read_item(epub_file.get_item(epub_file.opf.spine.toc))
+
+
+def run_parse_toc(data):
+    ncx.parse_toc(data)
+
+
+def setup_opf_object(context):
+    with epub.open_epub(context['path']) as epub_file:
+        return epub_file.opf
+
+
+def run_as_xml_document(opf_object):
+    opf_object.as_xml_document()
+
+
+def setup_open_epub(context):
+    epub_file = epub.open_epub(context['path'])
+    context['cleanup'].append(epub_file.close)
+    return epub_file
+
+
+def run_read_items(epub_file):
+    for item in epub_file.opf.manifest.values():
+        if item.href != epub.DEFAULT_NCX_PATH:
+            epub_file.read_item(item)
+
+
+def setup_concurrent_epub(context):
+    epub_file = epub.open_epub(context['path'], concurrent_reads=True)
+    context['cleanup'].append(epub_file.close)
+    return epub_file
+
+
+def run_read_items_threads(epub_file):
+    """Read every item, in THREADS threads sharing the same epub file."""
+    items = [item for item in epub_file.opf.manifest.values()
+             if item.href != epub.DEFAULT_NCX_PATH]
+
+    def read(items):
+        for item in items:
+            epub_file.read_item(item)
+    threads = [threading.Thread(target=read, args=(items[i::THREADS],))
+               for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def setup_write_epub(context):
+    """Return a new epub file with the members and TOC of the scenario."""
+    with epub.open_epub(context['path']) as source:
+        toc = source.toc
+        contents = [(item, source.read_item(item))
+                    for item in source.opf.manifest.values()
+                    if item.href != epub.DEFAULT_NCX_PATH]
+    path = os.path.join(context['directory'], 'write.epub')
+    epub_file = epub.open_epub(path, 'w')
+    for item, data in contents:
+        epub_file.add_item_stream(
+            data, opf.ManifestItem(item.identifier, item.href,
+                                   item.media_type),
+            append_to_spine=True)
+    epub_file.toc = toc
+    return epub_file
+
+
+def run_write_close(epub_file):
+    epub_file.close()
+
+
+STAGE_FUNCTIONS = {
+    'open': (setup_path, run_open),
+    'parse_opf': (setup_opf_bytes, run_parse_opf),
+    'parse_toc': (setup_ncx_bytes, run_parse_toc),
+    'as_xml_document': (setup_opf_object, run_as_xml_document),
+    'read_items': (setup_open_epub, run_read_items),
+    'read_items_threads': (setup_concurrent_epub, run_read_items_threads),
+    'write_close': (setup_write_epub, run_write_close),
+}
+
+
+def measure_stage(stage, context, repeat):
+    """Return the best time and the peak memory of a stage, as a dict."""
+    setup, run = STAGE_FUNCTIONS[stage]
+    times = []
+    for _ in range(repeat):
+        arg = setup(context)
+        gc.collect()
+        start = timer()
+        run(arg)
+        times.append(timer() - start)
+        del arg
+    peak = None
+    if tracemalloc is not None:
+        arg = setup(context)
+        gc.collect()
+        tracemalloc.start()
+        run(arg)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        del arg
+    for cleanup in context['cleanup']:
+        cleanup()
+    del context['cleanup'][:]
+    return {'time': min(times), 'peak': peak}
+
+
+def run_scenario(name, parameters, stages, repeat):
+    directory = tempfile.mkdtemp(prefix='epub-bench-')
+    try:
+        path = os.path.join(directory, '%s.epub' % name)
+        build_epub(path, *parameters)
+        context = {'path': path, 'directory': directory, 'cleanup': []}
+        return dict((stage, measure_stage(stage, context, repeat))
+                    for stage in stages)
+    finally:
+        shutil.rmtree(directory)
+
+
+# Reports
+
+def format_size(size):
+    if size is None:
+        return '-'
+    for unit in ('B', 'KiB', 'MiB'):
+        if size < 1024:
+            return '%.1f %s' % (size, unit)
+        size /= 1024
+    return '%.1f GiB' % size
+
+
+def compare(value, reference, tolerance, threshold=0):
+    """Return the ratio of `value` to `reference`, and a regression flag.
+
+    A difference below `threshold` is never a regression: it keeps the
+    timer noise of very short stages out of the report.
+    """
+    if value is None or not reference:
+        return None, False
+    ratio = value / reference
+    return ratio, ratio > 1 + tolerance and value - reference > threshold
+
+
+def print_results(results, baseline=None, tolerance=0.2, min_time=0):
+    """Print the results, and return the count of regressions."""
+    regressions = 0
+    for name in sorted(results):
+        print(name)
+        for stage in STAGES:
+            if stage not in results[name]:
+                continue
+            result = results[name][stage]
+            line = '  %-18s %10.2f ms %12s' % (
+                stage, result['time'] * 1000, format_size(result['peak']))
+            reference = (baseline or {}).get(name, {}).get(stage)
+            if reference is not None:
+                flags = []
+                for key in ('time', 'peak'):
+                    threshold = min_time if key == 'time' else 0
+                    ratio, regression = compare(result[key], reference[key],
+                                                tolerance, threshold)
+                    if ratio is None:
+                        flags.append('%6s' % '-')
+                        continue
+                    flags.append('%5.2fx%s' % (ratio,
+                                               '!' if regression else ' '))
+                    regressions += regression
+                line += '   ' + ' '.join(flags)
+            print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the epub library on synthetic epub files.')
+    parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                        help='scenarios to run, among: %s (default: all)'
+                        % ', '.join(DEFAULT_SCENARIOS))
+    parser.add_argument('--items', type=int,
+                        help='run a custom scenario with this manifest size')
+    parser.add_argument('--members', type=int,
+                        help='count of full-size members (default: items)')
+    parser.add_argument('--member-size', type=int, default=4096,
+                        help='size of members, in bytes (default: 4096)')
+    parser.add_argument('--toc-depth', type=int, default=2,
+                        help='depth of the TOC (default: 2)')
+    parser.add_argument('--toc-fanout', type=int, default=4,
+                        help='navPoints per TOC level (default: 4)')
+    parser.add_argument('--stored', action='store_true',
+                        help='store members without compression')
+    parser.add_argument('--stage', action='append', choices=STAGES,
+                        help='stage to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='runs of each stage (default: 5)')
+    parser.add_argument('--save', metavar='FILE',
+                        help='save the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='compare the results with a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed slowdown before a regression is '
+                        'reported (default: 0.2, ie. 20%%)')
+    parser.add_argument('--min-time', type=float, default=1.0,
+                        help='smallest slowdown reported as a regression, '
+                        'in milliseconds (default: 1)')
+    args = parser.parse_args()
+
+    compression = zipfile.ZIP_STORED if args.stored else zipfile.ZIP_DEFLATED
+    scenarios = {}
+    if args.items is not None:
+        members = args.items if args.members is None else args.members
+        scenarios['custom'] = (args.items, members, args.member_size,
+                               args.toc_depth, args.toc_fanout)
+    for name in args.scenarios or ([] if scenarios else DEFAULT_SCENARIOS):
+        if name not in SCENARIOS:
+            parser.error('unknown scenario: %s' % name)
+        scenarios[name] = SCENARIOS[name]
+
+    baseline = None
+    if args.compare:
+        with io.open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+
+    print('Python %s, epub %s, best of %d runs'
+          % (sys.version.split()[0], epub.__version__, args.repeat))
+    results = {}
+    for name in sorted(scenarios):
+        results[name] = run_scenario(
+            name, scenarios[name] + (compression,),
+            args.stage or STAGES, args.repeat)
+    regressions = print_results(results, baseline, args.tolerance,
+                                args.min_time / 1000)
+
+    if args.save:
+        data = {'python': sys.version.split()[0],
+                'scenarios': dict((name, list(parameters))
+                                  for name, parameters in scenarios.items()),
+                'results': results}
+        with io.open(args.save, 'w', encoding='utf-8') as f:
+            f.write('%s\n' % json.dumps(data, indent=2, sort_keys=True))
+    if regressions:
+        print('%d regression(s) over %d%%'
+              % (regressions, args.tolerance * 100))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,4 @@
+#!/bin/bash
+
+cd ../
+python script/bench.py "$@"
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Measure the memory used by parsed OPF and NCX objects, in bytes per item.
+
+Run it from the root of the repository:
+
+    python script/bench_memory.py [count]
+
+Only the objects themselves are measured (with their attribute storage and
+labels list): their string values are built beforehand and shared. Requires
+Python 3.4+ (tracemalloc).
+"""
+from __future__ import print_function, unicode_literals
+
+
+import gc
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+try:
+    import tracemalloc
+except ImportError:
+    sys.exit('tracemalloc is required (Python 3.4+).')
+
+from epub import ncx, opf
+
+
+DEFAULT_COUNT = 50000
+
+
+def build_manifest_item(i, values):
+    return opf.ManifestItem(values[i], values[i], 'application/xhtml+xml')
+
+
+def build_nav_point(i, values):
+    point = ncx.NavPoint()
+    point.identifier = values[i]
+    point.play_order = values[i]
+    point.src = values[i]
+    point.add_label(values[i])
+    return point
+
+
+def build_page_target(i, values):
+    target = ncx.PageTarget()
+    target.identifier = values[i]
+    target.value = values[i]
+    target.target_type = 'normal'
+    target.play_order = values[i]
+    target.src = values[i]
+    target.add_label(values[i])
+    return target
+
+
+def build_nav_target(i, values):
+    target = ncx.NavTarget()
+    target.identifier = values[i]
+    target.play_order = values[i]
+    target.src = values[i]
+    target.add_label(values[i])
+    return target
+
+
+def measure(build, count):
+    """Return the memory allocated per object built by `build`."""
+    values = ['item-%d' % i for i in range(count)]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [build(i, values) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # The list holding the objects is not part of their size
+    size = after - before - sys.getsizeof(objects)
+    return size / float(len(objects))
+
+
+def measure_manifest(manifest_class, count):
+    """Return the memory allocated per item of a `manifest_class` object."""
+    values = ['item-%d' % i for i in range(count)]
+    media_types = ['application/xhtml+xml', 'image/jpeg', 'image/png']
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    manifest = manifest_class()
+    for i in range(count):
+        manifest.add_item(values[i], values[i], media_types[i % 3])
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / float(len(manifest))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_COUNT
+    print('Python %s, %d objects per class' % (sys.version.split()[0], count))
+    for name, build in (('ManifestItem', build_manifest_item),
+                        ('NavPoint', build_nav_point),
+                        ('PageTarget', build_page_target),
+                        ('NavTarget', build_nav_target)):
+        print('%-17s %8.1f bytes' % (name, measure(build, count)))
+    for manifest_class in (opf.Manifest, opf.ColumnarManifest):
+        print('%-17s %8.1f bytes per item'
+              % (manifest_class.__name__,
+                 measure_manifest(manifest_class, count)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+import asyncio
+import os
+import tempfile
+import unittest
+
+from concurrent.futures import ThreadPoolExecutor
+from shutil import copy, rmtree
+
+
+import epub
+import epub.aio
+
+
+class TestAsyncEpubFile(unittest.TestCase):
+    epub_path = os.path.join(os.path.dirname(__file__), '_data/test.epub')
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(4)
+        with epub.open_epub(self.epub_path) as epub_file:
+            self.items = [item for item in epub_file.opf.manifest.values()
+                          if item.href.endswith('.xhtml')]
+            self.contents = [epub_file.read_item(item) for item in self.items]
+
+    def tearDown(self):
+        self.executor.shutdown()
+        self.loop.close()
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_open_epub(self):
+        async def run():
+            book = await epub.aio.open_epub(self.epub_path, lazy_toc=True,
+                                            executor=self.executor)
+            async with book:
+                self.assertEqual(book.opf_path, 'OEBPS/content.opf')
+                self.assertEqual(book.uid[1], 'BookId')
+                toc = await book.load_toc()
+                self.assertIs(book.toc, toc)
+                item = book.get_item('Section0002.xhtml')
+                self.assertIs(book.get_item_by_href(item.href), item)
+                return await book.read_item(item)
+
+        with epub.open_epub(self.epub_path) as epub_file:
+            expected = epub_file.read_item(
+                epub_file.get_item('Section0002.xhtml'))
+        self.assertEqual(self.run_async(run()), expected)
+
+    def test_open_epub_metadata(self):
+        metadata = self.run_async(
+            epub.aio.open_epub_metadata(self.epub_path))
+        self.assertEqual(metadata.opf.metadata.titles, [('Testing Epub', '')])
+
+    def test_concurrent_reads(self):
+        async def run(book):
+            async with book:
+                return await asyncio.gather(
+                    *[book.read_item(item) for item in self.items * 4])
+
+        book = self.run_async(epub.aio.open_epub(self.epub_path,
+                                                 executor=self.executor))
+        self.assertEqual(self.run_async(run(book)), self.contents * 4)
+        self.assertIsNone(book.epub_file.fp)
+
+    def test_iter_item(self):
+        async def read(book, item):
+            chunks = []
+            async for chunk in book.iter_item(item, chunk_size=100):
+                self.assertLessEqual(len(chunk), 100)
+                chunks.append(chunk)
+            return b''.join(chunks)
+
+        async def run():
+            book = await epub.aio.open_epub(self.epub_path)
+            async with book:
+                contents = await asyncio.gather(
+                    *[read(book, item) for item in self.items])
+                # An iterator can be closed before its end
+                iterator = book.iter_item(self.items[0], chunk_size=10)
+                first = await iterator.__anext__()
+                await iterator.aclose()
+                self.assertEqual(first, self.contents[0][:10])
+                return contents
+
+        self.assertEqual(self.run_async(run()), self.contents)
+
+    def test_write(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'write.epub')
+
+            async def run():
+                book = await epub.aio.open_epub(path, 'w',
+                                                executor=self.executor)
+                async with book:
+                    await asyncio.gather(*[
+                        book.add_item_stream(
+                            content, epub.opf.ManifestItem(
+                                item.identifier, item.href,
+                                item.media_type))
+                        for item, content in zip(self.items, self.contents)])
+
+            self.run_async(run())
+            with epub.open_epub(path) as book:
+                for item, content in zip(self.items, self.contents):
+                    self.assertEqual(book.read_item(item.href), content)
+        finally:
+            rmtree(directory)
+
+    def test_read_while_writing(self):
+        """Reads of a writable epub wait for the pending writes."""
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'append.epub')
+            copy(self.epub_path, path)
+            chunks = [('<p>%d</p>' % i).encode('utf-8') for i in range(10000)]
+
+            async def read(book, item):
+                parts = []
+                async for chunk in book.iter_item(item, chunk_size=100):
+                    parts.append(chunk)
+                return b''.join(parts)
+
+            async def run():
+                book = await epub.aio.open_epub(path, 'a',
+                                                executor=self.executor)
+                async with book:
+                    items = [epub.opf.ManifestItem(
+                        'new%d' % index, 'Text/new%d.xhtml' % index,
+                        'application/xhtml+xml') for index in range(4)]
+                    writes = [book.add_item_stream(iter(chunks), item)
+                              for item in items]
+                    reads = [book.read_item(item) for item in self.items]
+                    reads += [read(book, item) for item in self.items]
+                    results = await asyncio.gather(*(writes + reads))
+                    return results[len(writes):]
+
+            self.assertEqual(self.run_async(run()), self.contents * 2)
+            with epub.open_epub(path) as book:
+                self.assertIsNone(book.testzip())
+                for index in range(4):
+                    self.assertEqual(
+                        book.read_item('Text/new%d.xhtml' % index),
+                        b''.join(chunks))
+        finally:
+            rmtree(directory)
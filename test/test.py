@@ -2,8 +2,14 @@
 from __future__ import unicode_literals
 
 
+import io
 import os
+import sys
+import threading
+import time
 import unittest
+import warnings
+import zipfile
 import epub
 
 from shutil import copy, rmtree
@@ -42,6 +48,21 @@ class TestFunction(unittest.TestCase):
                 self.assertIsInstance(item, epub.opf.ManifestItem)
 
 
+    def test_open_epub_metadata(self):
+        test_path = os.path.join(os.path.dirname(__file__), self.epub_path)
+        metadata = epub.open_epub_metadata(test_path)
+
+        self.assertEqual(metadata.opf_path, 'OEBPS/content.opf')
+        self.assertEqual(metadata.content_path, 'OEBPS')
+        self.assertEqual(metadata.uid[1], 'BookId')
+        self.assertEqual(metadata.opf.metadata.titles, [('Testing Epub', '')])
+        self.assertEqual(len(metadata.opf.manifest), 0)
+
+        book = epub.Book(metadata)
+        self.assertEqual(book.languages, ['en'])
+        self.assertEqual(book.chapters, [])
+
+
 class TestFunctionWriteMode(unittest.TestCase):
 
     epub_path = '_data/write/test.epub'
@@ -104,6 +125,109 @@ class TestFunctionWriteModeNew(TestFunctionWriteMode):
         self._subtest_add_item(book)
         book.close()
 
+    def test_add_item_stream(self):
+        filename = os.path.join(os.path.dirname(__file__), self.epub_path)
+        sources = [
+            ('bytes', b'<p>bytes</p>'),
+            ('file', io.BytesIO(b'<p>file</p>' * 1000)),
+            ('chunks', (('<p>%d</p>' % i).encode('utf-8')
+                        for i in range(1000))),
+        ]
+
+        with epub.open_epub(filename, 'w') as book:
+            for identifier, source in sources:
+                item = epub.opf.ManifestItem(identifier=identifier,
+                                             href='Text/%s.xhtml' % identifier,
+                                             media_type=TEST_XHTML_MIMETYPE)
+                book.add_item_stream(source, item, identifier != 'file')
+
+            self.assertEqual(book.read_item('Text/bytes.xhtml'),
+                             b'<p>bytes</p>')
+            self.assertEqual(book.opf.spine.itemrefs,
+                             [('bytes', True), ('chunks', True)])
+
+            # An item is added to the manifest only once written
+            def failing_source():
+                yield b'<p>'
+                raise IOError('Broken source')
+            item = epub.opf.ManifestItem(identifier='failing',
+                                         href='Text/failing.xhtml',
+                                         media_type=TEST_XHTML_MIMETYPE)
+            with self.assertRaises(IOError):
+                book.add_item_stream(failing_source(), item, True)
+            self.assertNotIn('failing', book.opf.manifest)
+            self.assertEqual(book.opf.spine.itemrefs,
+                             [('bytes', True), ('chunks', True)])
+
+        with epub.open_epub(filename) as book:
+            if epub.ZIPFILE_OPEN_WRITE:
+                # Streams of unknown size can be larger than 2 GiB
+                self.assertEqual(
+                    book.getinfo('OEBPS/Text/chunks.xhtml').extract_version,
+                    zipfile.ZIP64_VERSION)
+                self.assertLess(
+                    book.getinfo('OEBPS/Text/bytes.xhtml').extract_version,
+                    zipfile.ZIP64_VERSION)
+            self.assertEqual(book.read_item('Text/file.xhtml'),
+                             b'<p>file</p>' * 1000)
+            self.assertEqual(book.read_item(book.get_item('chunks')),
+                             ''.join('<p>%d</p>' % i
+                                     for i in range(1000)).encode('utf-8'))
+            self.assertEqual(book.opf.spine.itemrefs,
+                             [('bytes', True), ('chunks', True)])
+
+    def test_item_range(self):
+        filename = os.path.join(os.path.dirname(__file__), self.epub_path)
+        content = bytes(bytearray(range(256))) * 16
+        item = epub.opf.ManifestItem(identifier='audio',
+                                     href='Audio/track.bin',
+                                     media_type='application/octet-stream')
+
+        with epub.open_epub(filename, 'w') as book:
+            book.add_item_stream(content, item)
+
+        with epub.open_epub(filename) as book:
+            offset, length = book.get_item_range(item)
+            self.assertEqual(length, len(content))
+            with open(filename, 'rb') as f:
+                f.seek(offset)
+                self.assertEqual(f.read(length), content)
+
+            self.assertEqual(book.read_item_range(item, 1000, 10),
+                             content[1000:1010])
+            self.assertEqual(book.read_item_range(item, 4000),
+                             content[4000:])
+            self.assertEqual(book.read_item_range(item, 4000, 1000),
+                             content[4000:])
+            self.assertEqual(book.read_item_range(item, 5000), b'')
+            self.assertRaises(ValueError, book.read_item_range, item, -1)
+
+    @unittest.skipIf(not epub.MMAP_MEMORYVIEW,
+                     'mmap.mmap has no buffer interface')
+    def test_read_item_view(self):
+        filename = os.path.join(os.path.dirname(__file__), self.epub_path)
+        content = b'<p>stored</p>' * 100
+        item = epub.opf.ManifestItem(identifier='stored',
+                                     href='Text/stored.xhtml',
+                                     media_type=TEST_XHTML_MIMETYPE)
+
+        with epub.open_epub(filename, 'w') as book:
+            book.add_item_stream(content, item)
+
+        self.assertRaises(ValueError, epub.open_epub, filename, 'a',
+                          use_mmap=True)
+
+        with epub.open_epub(filename, use_mmap=True) as book:
+            self.assertEqual(book.filename, filename)
+            view = book.read_item_view(item)
+            self.assertIsInstance(view, memoryview)
+            self.assertEqual(view.tobytes(), content)
+            self.assertEqual(book.read_item(item), content)
+            self.assertEqual(book.read_item_range(item, 3, 6), b'stored')
+        # The view is still usable once the epub is closed
+        self.assertEqual(view[:3].tobytes(), b'<p>')
+        view.release()
+
 
 class TestFunctionWriteModeAppend(TestFunctionWriteMode):
 
@@ -157,6 +281,123 @@ class TestFunctionWriteModeAppend(TestFunctionWriteMode):
         self._subtest_add_item(book)
         book.close()
 
+        # OPF and NCX files are written again on close, after the new item
+        book = epub.open(working_copy_filename, 'r')
+        self.assertIsNone(book.testzip())
+        self.assertIn('AddItem0001', book.opf.manifest)
+        self.assertEqual(book.read_item('Text/add_item.xhtml'),
+                         book.read('OEBPS/Text/add_item.xhtml'))
+        book.close()
+
+    def test_remove_paths(self):
+        working_copy_filename = os.path.join(os.path.dirname(__file__),
+                                             self.epub_path)
+        chapter = 'OEBPS/Text/Section0001.xhtml'
+        book = epub.open(working_copy_filename, 'a')
+        before = book.getinfo(chapter)
+        before = (before.header_offset, before.compress_size)
+        content = book.read(chapter)
+
+        # Remove a member in the middle of the archive
+        book.remove_paths(['META-INF/container.xml'])
+        self.assertNotIn('META-INF/container.xml', book.namelist())
+        self.assertEqual(book.getinfo('mimetype').header_offset, 0)
+        info = book.getinfo(chapter)
+        self.assertLess(info.header_offset, before[0])
+        self.assertEqual(info.compress_size, before[1])
+        self.assertEqual(book.read(chapter), content)
+        book.close()
+
+        book = epub.open(working_copy_filename, 'a')
+        self.assertIsNone(book.testzip())
+        self.assertEqual(book.read(chapter), content)
+
+        # Remove the last member: others are not moved
+        members = sorted(book.infolist(), key=lambda info: info.header_offset)
+        offsets = [info.header_offset for info in members[:-1]]
+        book.remove_paths([members[-1].filename])
+        self.assertEqual([info.header_offset for info in members[:-1]],
+                         offsets)
+        book.close()
+
+        book = epub.open(working_copy_filename, 'r')
+        self.assertIsNone(book.testzip())
+        self.assertEqual(book.read(chapter), content)
+        book.close()
+
+    def test_copy_member(self):
+        working_copy_filename = os.path.join(os.path.dirname(__file__),
+                                             self.epub_empty)
+        source_filename = os.path.join(os.path.dirname(__file__),
+                                       '_data/test.epub')
+        chapter = 'OEBPS/Text/Section0001.xhtml'
+
+        with zipfile.ZipFile(source_filename) as source:
+            source_info = source.getinfo(chapter)
+            content = source.read(chapter)
+            book = epub.open(working_copy_filename, 'w')
+            book.copy_member(source, chapter)
+            book.copy_member(source, source_info, 'OEBPS/Text/copy.xhtml')
+            book.close()
+
+        book = epub.open(working_copy_filename, 'r')
+        self.assertIsNone(book.testzip())
+        for name in (chapter, 'OEBPS/Text/copy.xhtml'):
+            info = book.getinfo(name)
+            self.assertEqual(info.compress_type, source_info.compress_type)
+            self.assertEqual(info.compress_size, source_info.compress_size)
+            self.assertEqual(info.CRC, source_info.CRC)
+            self.assertEqual(book.read(name), content)
+
+        with self.assertRaises(IOError):
+            book.copy_member(book, chapter, 'OEBPS/Text/other.xhtml')
+        book.close()
+
+    @unittest.skipIf(sys.version_info < (3, 6),
+                     'zipfile.ZipFile.open has no write mode')
+    def test_copy_member_while_writing(self):
+        working_copy_filename = os.path.join(os.path.dirname(__file__),
+                                             self.epub_empty)
+        source_filename = os.path.join(os.path.dirname(__file__),
+                                       '_data/test.epub')
+        chapter = 'OEBPS/Text/Section0001.xhtml'
+
+        with zipfile.ZipFile(source_filename) as source:
+            content = source.read(chapter)
+            book = epub.open(working_copy_filename, 'w')
+            with book.open('OEBPS/Text/written.xhtml', 'w') as member:
+                member.write(b'<html/>')
+                with self.assertRaises(ValueError):
+                    book.copy_member(source, chapter)
+            book.copy_member(source, chapter)
+            book.close()
+
+        book = epub.open(working_copy_filename, 'r')
+        self.assertIsNone(book.testzip())
+        self.assertEqual(book.read(chapter), content)
+        self.assertEqual(book.read('OEBPS/Text/written.xhtml'), b'<html/>')
+        book.close()
+
+    def test_repack(self):
+        working_copy_filename = os.path.join(os.path.dirname(__file__),
+                                             self.epub_path)
+        repacked_filename = os.path.join(os.path.dirname(__file__),
+                                         self.epub_empty)
+        book = epub.open(working_copy_filename, 'r')
+        book.repack(repacked_filename)
+
+        with zipfile.ZipFile(repacked_filename) as repacked:
+            self.assertIsNone(repacked.testzip())
+            self.assertEqual(repacked.infolist()[0].filename, 'mimetype')
+            self.assertEqual(sorted(repacked.namelist()),
+                             sorted(book.namelist()))
+            for info in book.infolist():
+                self.assertEqual(repacked.getinfo(info.filename).compress_size,
+                                 info.compress_size)
+                self.assertEqual(repacked.read(info.filename),
+                                 book.read(info.filename))
+        book.close()
+
     def test_open_new(self):
         working_copy_filename = os.path.join(os.path.dirname(__file__),
                                              self.epub_empty)
@@ -201,6 +442,133 @@ class TestEpubFile(unittest.TestCase):
                                           item.href)
         self.assertTrue(os.path.isfile(extracted_filename))
 
+    def test_open_item(self):
+        item = self.epub_file.get_item('Section0002.xhtml')
+        expected = self.epub_file.read_item(item)
+
+        with self.epub_file.open_item(item) as f:
+            self.assertEqual(f.read(10), expected[:10])
+            self.assertEqual(f.read(), expected[10:])
+
+        with self.epub_file.open_item(item.href) as f:
+            self.assertEqual(f.read(), expected)
+
+        self.assertRaises(KeyError, self.epub_file.open_item, 'Text/none')
+
+    @unittest.skipIf(not epub.MMAP_MEMORYVIEW,
+                     'mmap.mmap has no buffer interface')
+    def test_use_mmap(self):
+        item = self.epub_file.get_item('Section0002.xhtml')
+        expected = self.epub_file.read_item(item)
+
+        with epub.open_epub(self.epub_path, use_mmap=True) as book:
+            self.assertEqual(book.opf.metadata.titles,
+                             self.epub_file.opf.metadata.titles)
+            self.assertEqual(book.read_item(item), expected)
+            self.assertEqual(book.read_item_view(item).tobytes(), expected)
+            with book.open_item(item) as f:
+                self.assertEqual(f.read(), expected)
+
+        self.assertEqual(self.epub_file.read_item_view(item).tobytes(),
+                         expected)
+
+    @unittest.skipIf(epub.MMAP_MEMORYVIEW, 'mmap.mmap has a buffer interface')
+    def test_use_mmap_python2(self):
+        self.assertRaises(ValueError, epub.open_epub, self.epub_path,
+                          use_mmap=True)
+
+    def test_open_buffer(self):
+        item = self.epub_file.get_item('Section0002.xhtml')
+        expected = self.epub_file.read_item(item)
+        with open(self.epub_path, 'rb') as f:
+            content = f.read()
+
+        sources = [bytearray(content), memoryview(content)]
+        if bytes is not str:
+            # With Python 2, bytes are paths
+            sources.append(content)
+        for source in sources:
+            with epub.open_epub(source) as book:
+                self.assertIsNone(book.filename)
+                self.assertEqual(book.opf.metadata.titles,
+                                 self.epub_file.opf.metadata.titles)
+                self.assertEqual(len(book.toc.nav_map.nav_point), 6)
+                self.assertEqual(book.read_item(item), expected)
+                self.assertEqual(book.read_item_view(item).tobytes(),
+                                 expected)
+                self.assertEqual(epub.Book(book).titles,
+                                 [('Testing Epub', '')])
+
+            metadata = epub.open_epub_metadata(source)
+            self.assertEqual(metadata.opf.metadata.titles,
+                             [('Testing Epub', '')])
+
+        self.assertRaises(ValueError, epub.open_epub, bytearray(content), 'a')
+
+    def test_concurrent_reads(self):
+        items = list(self.epub_file.opf.manifest.values())
+        expected = [self.epub_file.read_item(item) for item in items]
+        with open(self.epub_path, 'rb') as f:
+            content = f.read()
+
+        def read_all(book):
+            results = [None] * 8
+
+            def run(index):
+                results[index] = [book.read_item(item) for item in items]
+            threads = [threading.Thread(target=run, args=(index,))
+                       for index in range(len(results))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return results
+
+        sources = [(self.epub_path, False), (bytearray(content), False)]
+        if epub.MMAP_MEMORYVIEW:
+            sources.append((self.epub_path, True))
+        for source, use_mmap in sources:
+            with epub.open_epub(source, use_mmap=use_mmap,
+                                concurrent_reads=True) as book:
+                self.assertEqual(read_all(book), [expected] * 8)
+                self.assertEqual(book.read_item_range(items[1], 2, 10),
+                                 expected[1][2:12])
+
+        # Without os.pread, each thread has its own file object
+        with epub.open_epub(self.epub_path, concurrent_reads=True) as book:
+            book._reader.close()
+            self.assertEqual(read_all(book), [expected] * 8)
+            self.assertEqual(len(book._reader._files), 8)
+        self.assertIsNone(book._reader)
+
+        self.assertRaises(ValueError, epub.open_epub, self.epub_path, 'a',
+                          concurrent_reads=True)
+        with open(self.epub_path, 'rb') as f:
+            self.assertRaises(ValueError, epub.open_epub, f,
+                              concurrent_reads=True)
+
+    def test_columnar_manifest(self):
+        with epub.open_epub(self.epub_path,
+                            manifest_class=epub.opf.ColumnarManifest) as book:
+            self.assertIsInstance(book.opf.manifest, epub.opf.ColumnarManifest)
+            self.assertEqual(list(book.opf.manifest),
+                             list(self.epub_file.opf.manifest))
+            item = book.get_item('Section0002.xhtml')
+            self.assertEqual(book.read_item(item),
+                             self.epub_file.read_item(item))
+            self.assertEqual(book.get_item_by_href(item.href).identifier,
+                             item.identifier)
+
+    def test_item_range_compressed(self):
+        item = self.epub_file.get_item('Section0002.xhtml')
+        expected = self.epub_file.read_item(item)
+
+        self.assertRaises(ValueError, self.epub_file.get_item_range, item)
+        self.assertEqual(self.epub_file.read_item_range(item, 100, 50),
+                         expected[100:150])
+        self.assertEqual(self.epub_file.read_item_range(item, 100),
+                         expected[100:])
+
     def test_get_item(self):
         """Check EpubFile.get_item() return an EpubManifestItem by its id"""
         item = self.epub_file.get_item('Section0002.xhtml')
@@ -224,12 +592,49 @@ class TestEpubFile(unittest.TestCase):
         self.assertEqual(self.epub_file.get_item_by_href('BadHref'), None)
 
         # Change only Id, so there is 2 item with the same href attribute
-        item.identifier = 'CopyOfSection0002.xhtml'
-        self.epub_file.opf.manifest.append(item)
+        copy_item = epub.opf.ManifestItem('CopyOfSection0002.xhtml', item.href)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', SyntaxWarning)
+            self.epub_file.opf.manifest.append(copy_item)
 
         with self.assertRaises(LookupError):
             self.epub_file.get_item_by_href(item.href)
 
+    def test_lazy_toc(self):
+        """With lazy_toc, the NCX file is parsed on first access to toc."""
+        with epub.open_epub(self.epub_path, lazy_toc=True) as book:
+            self.assertIsNone(book._toc)
+            self.assertIsInstance(book.toc, epub.ncx.Ncx)
+            self.assertEqual(len(book.toc.nav_map.nav_point),
+                             len(self.epub_file.toc.nav_map.nav_point))
+            self.assertIsNone(book._toc_item)
+
+    def test_lazy_toc_threads(self):
+        """A lazy toc used by several threads at once is parsed once."""
+        with epub.open_epub(self.epub_path, lazy_toc=True) as book:
+            parse_toc = book._parse_toc
+            items = []
+
+            def slow_parse_toc(item):
+                items.append(item)
+                time.sleep(0.05)
+                return parse_toc(item)
+            book._parse_toc = slow_parse_toc
+
+            tocs = []
+            threads = [threading.Thread(target=lambda: tocs.append(book.toc))
+                       for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(len(items), 1)
+            self.assertIsNotNone(items[0])
+            self.assertEqual(len(tocs), 8)
+            for toc in tocs:
+                self.assertIs(toc, tocs[0])
+
     def test_add_item_fail(self):
         """
         When open in read-only mode, add_item must fail.
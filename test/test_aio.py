@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+import sys
+
+
+# epub.aio and its tests use the async syntax of Python 3.5+: the tests are
+# kept in a module that older versions never import.
+if sys.version_info >= (3, 5):
+    from aio_cases import TestAsyncEpubFile  # noqa
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+import os
+import unittest
+
+
+import epub
+import epub.batch
+
+
+class TestFunction(unittest.TestCase):
+    epub_path = os.path.join(os.path.dirname(__file__), '_data/test.epub')
+    missing_path = os.path.join(os.path.dirname(__file__), '_data/missing.epub')
+
+    def _check_results(self, results, metadata_only=False):
+        results = dict((result.path, result) for result in results)
+        self.assertEqual(sorted(results),
+                         sorted([self.epub_path, self.missing_path]))
+
+        result = results[self.epub_path]
+        self.assertIsNone(result.error)
+        self.assertEqual(result.opf_path, 'OEBPS/content.opf')
+        self.assertEqual(result.opf.metadata.titles, [('Testing Epub', '')])
+        if metadata_only:
+            self.assertIsNone(result.toc)
+            self.assertEqual(len(result.opf.manifest), 0)
+        else:
+            self.assertIsInstance(result.toc, epub.ncx.Ncx)
+            self.assertEqual(len(result.opf.manifest), 7)
+
+        result = results[self.missing_path]
+        self.assertIsInstance(result.error, IOError)
+        self.assertIsNone(result.opf)
+
+    def test_open_many(self):
+        paths = [self.epub_path, self.missing_path]
+        self._check_results(epub.batch.open_many(paths, workers=2))
+
+    def test_open_many_metadata_only(self):
+        paths = [self.epub_path, self.missing_path]
+        self._check_results(epub.batch.open_many(paths, workers=2,
+                                                 metadata_only=True),
+                            metadata_only=True)
+
+    def test_open_many_serial(self):
+        paths = [self.epub_path, self.missing_path]
+        self._check_results(epub.batch.open_many(paths, workers=1))
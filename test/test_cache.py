@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+import os
+import tempfile
+import unittest
+
+from shutil import rmtree
+
+
+import epub
+import epub.cache
+
+
+class TestParseCache(unittest.TestCase):
+    epub_path = os.path.join(os.path.dirname(__file__), '_data/test.epub')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = epub.cache.ParseCache(self.directory)
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def test_open_epub(self):
+        with epub.open_epub(self.epub_path, cache=self.cache) as book:
+            key = self.cache.fingerprint(book)
+            titles = book.opf.metadata.titles
+            nav_points = len(book.toc.nav_map.nav_point)
+        self.assertIsNotNone(self.cache.get(key))
+
+        # A warm open must not parse any xml
+        parse_opf, parse_toc = epub.opf.parse_opf, epub.ncx.parse_toc
+        def fail(*args, **kwargs):
+            raise AssertionError('Cached epub must not be parsed.')
+        epub.opf.parse_opf = epub.ncx.parse_toc = fail
+        try:
+            with epub.open_epub(self.epub_path, cache=self.cache) as book:
+                self.assertEqual(book.opf_path, 'OEBPS/content.opf')
+                self.assertEqual(book.uid[1], 'BookId')
+                self.assertEqual(book.opf.metadata.titles, titles)
+                self.assertEqual(len(book.toc.nav_map.nav_point), nav_points)
+        finally:
+            epub.opf.parse_opf, epub.ncx.parse_toc = parse_opf, parse_toc
+
+    def test_get_missing_or_broken(self):
+        self.assertIsNone(self.cache.get('missing'))
+
+        path = os.path.join(self.directory,
+                            'broken' + epub.cache.ENTRY_SUFFIX)
+        with open(path, 'wb') as f:
+            f.write(b'not a cache entry')
+        self.assertIsNone(self.cache.get('broken'))
+        self.assertFalse(os.path.exists(path))
+
+    def test_evict(self):
+        value = 'x' * 1000
+        self.cache.set('first', value)
+        size = os.path.getsize(os.path.join(self.directory,
+                                            'first' + epub.cache.ENTRY_SUFFIX))
+        self.cache.max_size = size * 2
+        self.cache.set('second', value)
+        # Make "second" the least recently used entry
+        os.utime(os.path.join(self.directory,
+                              'second' + epub.cache.ENTRY_SUFFIX), (0, 0))
+        self.assertEqual(self.cache.get('first'), value)
+        self.cache.set('third', value)
+
+        self.assertEqual(self.cache.get('first'), value)
+        self.assertIsNone(self.cache.get('second'))
+        self.assertEqual(self.cache.get('third'), value)
+
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('first'))
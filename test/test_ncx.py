@@ -2,7 +2,9 @@
 from __future__ import unicode_literals
 
 
+import io
 import os
+import pickle
 import unittest
 
 
@@ -50,6 +52,28 @@ class TestFunction(unittest.TestCase):
         self.assertEqual(len(toc.nav_lists[0].nav_target), 2,
                          'Il manque des page_target !')
 
+    def test_parse_toc_parsers(self):
+        """Both NCX parsers must build the same objects."""
+        def as_data(value):
+            if isinstance(value, list):
+                return [as_data(v) for v in value]
+            if hasattr(value, '__slots__'):
+                return dict((k, as_data(getattr(value, k)))
+                            for k in value.__slots__)
+            if hasattr(value, '__dict__'):
+                return dict((k, as_data(v)) for k, v in value.__dict__.items())
+            return value
+
+        test_path = os.path.join(os.path.dirname(__file__), self.ncx_path)
+        with open(test_path, 'rb') as f:
+            xml_string = f.read()
+
+        expected = epub.ncx.parse_toc(xml_string, epub.ncx.PARSER_MINIDOM)
+        result = epub.ncx.parse_toc(xml_string, epub.ncx.PARSER_ITERPARSE)
+
+        self.assertEqual(as_data(result), as_data(expected))
+        self.assertRaises(ValueError, epub.ncx.parse_toc, xml_string, 'sax')
+
     def test_parse_for_text_tag(self):
         """Test function "_parse_for_text_tag"."""
 
@@ -395,6 +419,23 @@ class TestNavPoint(unittest.TestCase):
         self.assertEqual(nav_point.as_xml_element().toxml(),
                          xml_element.toxml())
 
+    def test_slots(self):
+        nav_point = epub.ncx.NavPoint()
+        nav_point.identifier = 'point1'
+        nav_point.src = 'Text/Point1.xhtml'
+        nav_point.add_label('Label')
+        nav_point.add_point(epub.ncx.NavPoint())
+
+        self.assertFalse(hasattr(nav_point, '__dict__'))
+        self.assertRaises(AttributeError, setattr, nav_point, 'other', 1)
+
+        copy = pickle.loads(pickle.dumps(nav_point, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(copy.identifier, 'point1')
+        self.assertEqual(copy.labels, [('Label', '', '')])
+        self.assertEqual(len(copy.nav_point), 1)
+        self.assertEqual(copy.as_xml_element().toxml(),
+                         nav_point.as_xml_element().toxml())
+
 
 class TestNavMap(unittest.TestCase):
     
@@ -417,6 +458,58 @@ class TestNavMap(unittest.TestCase):
                          xml_element.toxml())
 
 
+class TestNavIndex(unittest.TestCase):
+
+    def _point(self, identifier, src):
+        point = epub.ncx.NavPoint()
+        point.identifier = identifier
+        point.src = src
+        return point
+
+    def test_index(self):
+        nav_map = epub.ncx.NavMap()
+        ch1 = self._point('ch1', 'Text/chap1.xhtml')
+        ch1_1 = self._point('ch1_1', 'Text/chap1.xhtml#s1')
+        ch1_1_1 = self._point('ch1_1_1', 'Text/chap1.xhtml#s1_1')
+        ch1_2 = self._point('ch1_2', 'Text/chap1.xhtml#s2')
+        ch2 = self._point('ch2', 'Text/chap2.xhtml')
+        ch1_1.add_point(ch1_1_1)
+        ch1.add_point(ch1_1)
+        ch1.add_point(ch1_2)
+        nav_map.add_point(ch1)
+        nav_map.add_point(ch2)
+
+        index = nav_map.index
+        self.assertIs(nav_map.index, index)
+        self.assertEqual([point.identifier for point in index],
+                         ['ch1', 'ch1_1', 'ch1_1_1', 'ch1_2', 'ch2'])
+        self.assertEqual(list(index.depths), [0, 1, 2, 1, 0])
+        self.assertEqual(list(index.parents), [-1, 0, 1, 0, -1])
+        self.assertEqual(list(index.sizes), [4, 2, 1, 1, 1])
+
+        self.assertEqual(index.position(ch1_2), 3)
+        self.assertEqual(index.depth(ch1_1_1), 2)
+        self.assertIs(index.parent(ch1_1_1), ch1_1)
+        self.assertIsNone(index.parent(ch2))
+        self.assertEqual(index.subtree(ch1), [ch1_1, ch1_1_1, ch1_2])
+        self.assertEqual(index.subtree(ch2), [])
+
+        self.assertEqual(index.find_by_src('Text/chap1.xhtml#s2'), [ch1_2])
+        self.assertEqual(index.find_by_src('Text/chap1.xhtml'),
+                         [ch1, ch1_1, ch1_1_1, ch1_2])
+        self.assertEqual(index.find_by_src('Text/chap1.xhtml#none'), [])
+        self.assertEqual(index.find_by_src('Text/none.xhtml'), [])
+
+        # Adding a top point drops the index; deeper changes need clear_index
+        ch3 = self._point('ch3', 'Text/chap3.xhtml')
+        nav_map.add_point(ch3)
+        self.assertEqual(len(nav_map.index), 6)
+        ch3.add_point(self._point('ch3_1', 'Text/chap3.xhtml#s1'))
+        self.assertEqual(len(nav_map.index), 6)
+        nav_map.clear_index()
+        self.assertEqual(len(nav_map.index), 7)
+
+
 class TestPageTarget(unittest.TestCase):
 
     def test_as_xml_element(self):
@@ -581,3 +674,22 @@ class TestNcx(unittest.TestCase):
         xml_output = xml_toc.strip()
 
         self.assertEqual(xml_output, xml_input)
+
+    def test_write_to(self):
+        """write_to must write the same bytes as as_xml_document()."""
+        test_path = os.path.join(os.path.dirname(__file__),
+                                 TestFunction.ncx_path)
+        with open(test_path, 'rb') as f:
+            toc = epub.ncx.parse_toc(f.read())
+        toc.nav_map.add_label('Table & <contents>', 'en', 'ltr')
+        toc.nav_map.nav_point[0].add_label('')
+        empty_list = epub.ncx.NavList()
+        empty_list.identifier = 'empty'
+        toc.add_nav_list(empty_list)
+
+        for value in (epub.ncx.Ncx(), toc):
+            expected = value.as_xml_document().toxml().encode('utf-8')
+            fp = io.BytesIO()
+            value.write_to(fp)
+            self.assertEqual(fp.getvalue(), expected)
+            self.assertEqual(value.as_xml_string(), expected)
@@ -2,7 +2,9 @@
 from __future__ import unicode_literals
 
 
+import io
 import unittest
+import warnings
 
 
 from xml.dom import minidom
@@ -56,6 +58,106 @@ class TestFunction(unittest.TestCase):
         self.assertIsInstance(opf.guide, epub.opf.Guide)
         self.assertIsInstance(opf.spine, epub.opf.Spine)
 
+    def test_parse_opf_parsers(self):
+        """Both OPF parsers must build the same objects."""
+        xml_string = """<?xml version="1.0" encoding="UTF-8"?>
+<package unique-identifier="BookId" version="2.0" xmlns="http://www.idpf.org/2007/opf">
+    <metadata xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:opf="http://www.idpf.org/2007/opf">
+        <dc:title xml:lang="fr">Metadonnée pour les tests.</dc:title>
+        <dc:title>Metadata for testing purpose</dc:title>
+        <dc:creator opf:file-as="Doe, Jhon" opf:role="aut">John Doe</dc:creator>
+        <dc:subject>This is an arbitrary subjet.</dc:subject>
+        <dc:contributor opf:role="other.test">Python unittest</dc:contributor>
+        <dc:date opf:event="creation">2012-01-05T16:18:00+00:00</dc:date>
+        <dc:identifier id="BookId" opf:scheme="UUID">
+            urn:uuid:477d1a82-a70d-4ee5-a0ff-0dddc60fd2bb
+        </dc:identifier>
+        <dc:language>en</dc:language>
+        <dc:rights>To the left!</dc:rights>
+        <meta content="0.4.2" name="Sigil version"/>
+    </metadata>
+    <manifest>
+        <item href="toc.ncx" id="ncx" media-type="application/x-dtbncx+xml"/>
+        <item href="Text/cover.xhtml" id="cover.xhtml" media-type="application/xhtml+xml"/>
+        <item href="Text/notes.xhtml" id="notes.xhtml" media-type="application/xhtml+xml" fallback="cover.xhtml"/>
+    </manifest>
+    <spine toc="ncx">
+        <itemref idref="cover.xhtml"/>
+        <itemref idref="notes.xhtml" linear="no"/>
+    </spine>
+    <guide>
+        <reference href="Text/cover.xhtml" title="Cover" type="cover"/>
+    </guide>
+</package>
+""".encode('utf-8')
+        expected = epub.opf.parse_opf(xml_string,
+                                      epub.opf.PARSER_MINIDOM)
+        result = epub.opf.parse_opf(xml_string,
+                                    epub.opf.PARSER_ITERPARSE)
+
+        self.assertEqual(result.uid_id, expected.uid_id)
+        self.assertEqual(result.metadata.__dict__, expected.metadata.__dict__)
+        def as_data(item):
+            return dict((k, getattr(item, k)) for k in item.__slots__)
+
+        self.assertEqual([as_data(item) for item in result.manifest.values()],
+                         [as_data(item) for item in expected.manifest.values()])
+        self.assertEqual(result.spine.toc, expected.spine.toc)
+        self.assertEqual(result.spine.itemrefs, expected.spine.itemrefs)
+        self.assertEqual(result.guide.references, expected.guide.references)
+
+        self.assertRaises(ValueError, epub.opf.parse_opf, xml_string, 'sax')
+
+    def test_parse_opf_duplicate_href(self):
+        """Items sharing the same href do not prevent parsing."""
+        xml_string = """<?xml version="1.0" ?>
+<package unique-identifier="BookId" version="2.0" xmlns="http://www.idpf.org/2007/opf">
+    <metadata xmlns:dc="http://purl.org/dc/elements/1.1/"/>
+    <manifest>
+        <item href="toc.ncx" id="ncx" media-type="application/x-dtbncx+xml"/>
+        <item href="toc.ncx" id="ncx2" media-type="application/x-dtbncx+xml"/>
+        <item href="Text/chap1.xhtml" id="chap1" media-type="application/xhtml+xml"/>
+    </manifest>
+    <spine toc="ncx">
+        <itemref idref="chap1"/>
+    </spine>
+</package>"""
+        options = [(parser, manifest_class)
+                   for parser in (epub.opf.PARSER_MINIDOM,
+                                  epub.opf.PARSER_ITERPARSE)
+                   for manifest_class in (epub.opf.Manifest,
+                                          epub.opf.ColumnarManifest)]
+        for parser, manifest_class in options:
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                opf = epub.opf.parse_opf(xml_string, parser, manifest_class)
+            self.assertEqual(caught[0].category, SyntaxWarning)
+            self.assertEqual(list(opf.manifest), ['ncx', 'ncx2', 'chap1'])
+            self.assertRaises(LookupError, opf.manifest.get_by_href, 'toc.ncx')
+            self.assertEqual(
+                opf.manifest.get_by_href('Text/chap1.xhtml').identifier,
+                'chap1')
+
+    def test_parse_opf_metadata(self):
+        """Parsing stops at </metadata>: what follows is never read."""
+        xml_string = """<?xml version="1.0" ?>
+<package unique-identifier="BookId" version="2.0" xmlns="http://www.idpf.org/2007/opf">
+    <metadata xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:opf="http://www.idpf.org/2007/opf">
+        <dc:title>Testing Epub</dc:title>
+        <dc:identifier id="BookId">1</dc:identifier>
+    </metadata>
+    <manifest>
+        <item href="toc.ncx" id="ncx" media-type="application/x-dtbncx+xml"/>
+    </manifest>
+    <spine toc="ncx"><itemref idref="ncx">
+"""
+        opf = epub.opf.parse_opf_metadata(io.BytesIO(xml_string.encode('utf-8')))
+        self.assertEqual(opf.uid_id, 'BookId')
+        self.assertEqual(opf.metadata.titles, [('Testing Epub', '')])
+        self.assertEqual(opf.metadata.identifiers, [('1', 'BookId', '')])
+        self.assertEqual(len(opf.manifest), 0)
+        self.assertEqual(opf.spine.itemrefs, [])
+
     def test_parse_xml_metadata(self):
         """Test _parse_xml_metadata."""
 
@@ -506,6 +608,52 @@ class TestManifest(unittest.TestCase):
         self.assertTrue(manifest_item in manifest)
         self.assertTrue(duck_ok in manifest)
 
+    def test_get_by_href(self):
+        """Check the href index stays up to date with the manifest."""
+        manifest = epub.opf.Manifest()
+        manifest.add_item('chap1', 'Text/chap1.xhtml')
+        manifest.add_item('chap2', 'Text/chap2.xhtml')
+        manifest.append(epub.opf.ManifestItem('chap3', 'Text/chap3.xhtml'))
+
+        self.assertEqual(manifest.get_by_href('Text/chap1.xhtml').identifier,
+                         'chap1')
+        self.assertEqual(manifest.get_by_href('Text/chap3.xhtml').identifier,
+                         'chap3')
+        self.assertIsNone(manifest.get_by_href('Text/missing.xhtml'))
+
+        # Duplicate href are accepted with a warning, but are ambiguous
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            manifest.add_item('copy', 'Text/chap1.xhtml')
+        self.assertEqual(caught[0].category, SyntaxWarning)
+        self.assertIn('copy', manifest)
+        with self.assertRaises(LookupError):
+            manifest.get_by_href('Text/chap1.xhtml')
+        del manifest['copy']
+        self.assertEqual(manifest.get_by_href('Text/chap1.xhtml').identifier,
+                         'chap1')
+
+        # Replace an item with a new href
+        manifest['chap1'] = epub.opf.ManifestItem('chap1', 'Text/new.xhtml')
+        self.assertIsNone(manifest.get_by_href('Text/chap1.xhtml'))
+        self.assertEqual(manifest.get_by_href('Text/new.xhtml').identifier,
+                         'chap1')
+
+        # Deletions
+        del manifest['chap1']
+        self.assertIsNone(manifest.get_by_href('Text/new.xhtml'))
+        manifest.pop('chap2')
+        self.assertIsNone(manifest.get_by_href('Text/chap2.xhtml'))
+        manifest.popitem()
+        self.assertIsNone(manifest.get_by_href('Text/chap3.xhtml'))
+
+        manifest.add_item('chap1', 'Text/chap1.xhtml')
+        manifest.clear()
+        self.assertIsNone(manifest.get_by_href('Text/chap1.xhtml'))
+        manifest.add_item('copy', 'Text/chap1.xhtml')
+        self.assertEqual(manifest.get_by_href('Text/chap1.xhtml').identifier,
+                         'copy')
+
     def test_add_item(self):
         """Check epub.opf.Manifest.add_item()"""
 
@@ -543,6 +691,142 @@ class TestManifest(unittest.TestCase):
         self.assertEqual(xml_output, xml_input)
 
 
+    def test_get_by_media_type(self):
+        manifest = epub.opf.Manifest()
+        manifest.add_item('chap1', 'Text/chap1.xhtml', 'application/xhtml+xml')
+        manifest.add_item('img1', 'Images/1.png', 'image/png')
+        manifest.add_item('chap2', 'Text/chap2.xhtml', 'application/xhtml+xml')
+
+        self.assertEqual([item.identifier for item in
+                          manifest.get_by_media_type('application/xhtml+xml')],
+                         ['chap1', 'chap2'])
+        self.assertEqual(manifest.get_hrefs('image/png'), ['Images/1.png'])
+        self.assertEqual(manifest.get_hrefs(),
+                         ['Text/chap1.xhtml', 'Images/1.png',
+                          'Text/chap2.xhtml'])
+
+
+class TestColumnarManifest(unittest.TestCase):
+
+    xml_string = """<manifest>
+    <item id="css1" href="happy.css" media-type="text/css" />
+    <item id="item2" href="Doc1.less-hpy" media-type="text/less-happy+xml" required-namespace="http://happy.com/ns/happy2/" fallback="item2.5" fallback-style="css1" />
+    <item id="item2.5" href="Doc1.htm" media-type="application/xhtml+xml" required-namespace="http://www.w3.org/1999/xhtml" required-modules="ruby, server-side-image-map" fallback="item3" />
+    <item id="item1" href="Doc1.hpy" media-type="text/happy+xml" required-namespace="http://happy.com/ns/happy1/" fallback="item2" />
+    <item id="item4" href="Doc2.hpy" media-type="text/happy+xml" required-namespace="http://happy.com/ns/happy1/" fallback-style="css1" />
+    <item id="item3" href="Doc1.dtb" media-type="application/x-dtbook+xml" />
+</manifest>"""
+
+    def test_same_as_manifest(self):
+        """A ColumnarManifest must hold the same items as a Manifest."""
+        xml_element = minidom.parseString(self.xml_string).documentElement
+        expected = epub.opf._parse_xml_manifest(xml_element)
+        manifest = epub.opf._parse_xml_manifest(
+            xml_element, epub.opf.ColumnarManifest)
+
+        self.assertIsInstance(manifest, epub.opf.ColumnarManifest)
+        self.assertEqual(list(manifest), list(expected))
+        for key, item in manifest.items():
+            self.assertIsInstance(item, epub.opf.ManifestItem)
+            self.assertEqual(item.as_xml_element().toxml(),
+                             expected[key].as_xml_element().toxml())
+        self.assertEqual(manifest.as_xml_element().toxml(),
+                         expected.as_xml_element().toxml())
+
+        writer_output = io.BytesIO()
+        writer = epub.utils.XmlWriter(writer_output)
+        manifest.write_xml(writer)
+        writer.flush()
+        self.assertEqual(writer_output.getvalue(),
+                         expected.as_xml_element().toxml().encode('utf-8'))
+
+        for media_type in ('text/happy+xml', 'text/css', 'image/png'):
+            self.assertEqual(manifest.get_hrefs(media_type),
+                             expected.get_hrefs(media_type))
+            self.assertEqual(
+                [item.identifier for item in
+                 manifest.get_by_media_type(media_type)],
+                [item.identifier for item in
+                 expected.get_by_media_type(media_type)])
+        self.assertEqual(manifest.get_hrefs(), expected.get_hrefs())
+
+    def test_dict_behavior(self):
+        manifest = epub.opf.ColumnarManifest()
+        manifest.add_item('chap1', 'Text/chap1.xhtml', 'application/xhtml+xml')
+        manifest.add_item('img1', 'Images/1.png', 'image/png')
+        manifest.add_item('chap2', 'Text/chap2.xhtml', 'application/xhtml+xml')
+
+        self.assertEqual(len(manifest), 3)
+        self.assertIn('img1', manifest)
+        self.assertIn(epub.opf.ManifestItem('img1', 'Images/1.png'), manifest)
+        self.assertEqual(manifest.get_by_href('Images/1.png').identifier,
+                         'img1')
+        self.assertIsNone(manifest.get('missing'))
+
+        with self.assertRaises(ValueError):
+            manifest['other'] = epub.opf.ManifestItem('img2', 'Images/2.png')
+
+        # Duplicate href are accepted with a warning, but are ambiguous
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            manifest.add_item('copy', 'Text/chap1.xhtml')
+        self.assertEqual(caught[0].category, SyntaxWarning)
+        with self.assertRaises(LookupError):
+            manifest.get_by_href('Text/chap1.xhtml')
+        del manifest['copy']
+        self.assertEqual(manifest.get_by_href('Text/chap1.xhtml').identifier,
+                         'chap1')
+
+        # Items are copies: set them again to change the manifest
+        item = manifest['chap1']
+        item.href = 'Text/new.xhtml'
+        self.assertEqual(manifest['chap1'].href, 'Text/chap1.xhtml')
+        manifest['chap1'] = item
+        self.assertEqual(list(manifest), ['chap1', 'img1', 'chap2'])
+        self.assertIsNone(manifest.get_by_href('Text/chap1.xhtml'))
+        self.assertEqual(manifest.get_by_href('Text/new.xhtml').identifier,
+                         'chap1')
+
+        del manifest['img1']
+        self.assertEqual(list(manifest), ['chap1', 'chap2'])
+        self.assertEqual(manifest['chap2'].href, 'Text/chap2.xhtml')
+        self.assertIsNone(manifest.get_by_href('Images/1.png'))
+        self.assertEqual(manifest.get_hrefs('image/png'), [])
+
+        manifest.clear()
+        self.assertEqual(len(manifest), 0)
+        manifest.add_item('copy', 'Text/chap1.xhtml')
+        self.assertEqual(manifest.get_by_href('Text/chap1.xhtml').identifier,
+                         'copy')
+
+    def test_equality(self):
+        """Manifests are equal when their items have the same values."""
+        manifest = epub.opf.ColumnarManifest()
+        manifest.add_item('img1', 'Images/1.png', 'image/png')
+        manifest.add_item('chap1', 'Text/chap1.xhtml', 'application/xhtml+xml',
+                          fallback='img1')
+        self.assertTrue(manifest == manifest)
+        self.assertFalse(manifest != manifest)
+
+        # Media types are known under other codes in this one
+        other = epub.opf.ColumnarManifest()
+        other.add_item('chap1', 'Text/chap1.xhtml', 'application/xhtml+xml')
+        other.add_item('img1', 'Images/1.png', 'image/png')
+        del other['chap1']
+        other.add_item('chap1', 'Text/chap1.xhtml', 'application/xhtml+xml',
+                       fallback='img1')
+        self.assertEqual(manifest, other)
+
+        other['chap1'] = epub.opf.ManifestItem(
+            'chap1', 'Text/chap1.xhtml', 'application/xhtml+xml')
+        self.assertNotEqual(manifest, other)
+
+        reordered = epub.opf.ColumnarManifest(reversed(list(
+            manifest.values())))
+        self.assertNotEqual(manifest, reordered)
+        self.assertNotEqual(manifest, epub.opf.ColumnarManifest())
+
+
 class TestGuide(unittest.TestCase):
 
     def test_as_xml_element(self):
@@ -678,3 +962,35 @@ class TestOpf(unittest.TestCase):
         xml_output = opf.as_xml_document().toprettyxml('    ').strip()
 
         self.assertEqual(xml_input, xml_output)
+
+    def test_write_to(self):
+        """write_to must write the same bytes as as_xml_document()."""
+        opf = epub.opf.Opf(uid_id='BookId')
+        metadata = opf.metadata
+        metadata.add_title('Testing & <escaping> "quotes"', 'en')
+        metadata.add_title('Sans langue')
+        metadata.add_creator('Florian Strzelecki', 'aut', 'Strzelecki, F.')
+        metadata.add_contributor('Python unittest')
+        metadata.add_subject('Tests')
+        metadata.add_date('2012-01-05', 'creation')
+        metadata.add_identifier('urn:uuid:1', 'BookId', 'UUID')
+        metadata.add_language('en')
+        metadata.description = 'A > B'
+        metadata.right = 'To the left!'
+        metadata.add_meta('Sigil version', '0.4.2')
+        opf.manifest.add_item('ncx', 'toc.ncx', 'application/x-dtbncx+xml')
+        opf.manifest.add_item('chap1', 'Text/chap1.xhtml',
+                              'application/xhtml+xml', fallback='ncx',
+                              fallback_style='css')
+        opf.spine.toc = 'ncx'
+        opf.spine.add_itemref('chap1')
+        opf.spine.add_itemref('ncx', False)
+        opf.guide.add_reference('Text/chap1.xhtml', 'text', 'Text')
+        opf.guide.add_reference('Text/chap1.xhtml#notes')
+
+        for value in (epub.opf.Opf(), opf):
+            expected = value.as_xml_document().toxml().encode('utf-8')
+            fp = io.BytesIO()
+            value.write_to(fp)
+            self.assertEqual(fp.getvalue(), expected)
+            self.assertEqual(value.as_xml_string(), expected)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+import os
+import tempfile
+import threading
+import unittest
+
+from shutil import copy, rmtree
+
+
+import epub
+import epub.pool
+
+
+class TestEpubPool(unittest.TestCase):
+    epub_path = os.path.join(os.path.dirname(__file__), '_data/test.epub')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.paths = []
+        for name in ('first.epub', 'second.epub', 'third.epub'):
+            path = os.path.join(self.directory, name)
+            copy(self.epub_path, path)
+            self.paths.append(path)
+        self.pool = epub.pool.EpubPool(max_size=2)
+
+    def tearDown(self):
+        self.pool.close()
+        rmtree(self.directory)
+
+    def test_open(self):
+        with self.pool.open(self.paths[0]) as book:
+            self.assertIsInstance(book, epub.EpubFile)
+            self.assertEqual(book.mode, 'r')
+            with self.pool.open(self.paths[0]) as same_book:
+                self.assertIs(same_book, book)
+        self.assertIn(self.paths[0], self.pool)
+
+        with self.pool.open(self.paths[0]) as same_book:
+            self.assertIs(same_book, book)
+
+    def test_evict(self):
+        with self.pool.open(self.paths[0]) as first:
+            with self.pool.open(self.paths[1]):
+                pass
+            with self.pool.open(self.paths[2]):
+                pass
+            # Evicted, but still in use: not closed yet
+            self.assertNotIn(self.paths[0], self.pool)
+            self.assertIsNotNone(first.fp)
+            first.read_item('Text/cover.xhtml')
+        self.assertIsNone(first.fp)
+        self.assertEqual(len(self.pool), 2)
+
+    def test_file_changed(self):
+        with self.pool.open(self.paths[0]) as book:
+            pass
+        stat = os.stat(self.paths[0])
+        os.utime(self.paths[0], (stat.st_atime, stat.st_mtime + 10))
+
+        with self.pool.open(self.paths[0]) as new_book:
+            self.assertIsNot(new_book, book)
+        self.assertIsNone(book.fp)
+
+        self.pool.invalidate(self.paths[0])
+        self.assertNotIn(self.paths[0], self.pool)
+        self.assertIsNone(new_book.fp)
+
+    def test_read_item_threads(self):
+        expected = self.pool.read_item(self.paths[0], 'Text/Section0001.xhtml')
+        errors = []
+
+        def read():
+            try:
+                for i in range(20):
+                    for path in self.paths:
+                        content = self.pool.read_item(
+                            path, 'Text/Section0001.xhtml')
+                        if content != expected:
+                            errors.append(content)
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=read) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+import os
+import tempfile
+import unittest
+
+from shutil import rmtree
+
+
+import epub
+import epub.cache
+import epub.stats
+
+
+class TestEpubStats(unittest.TestCase):
+    epub_path = os.path.join(os.path.dirname(__file__), '_data/test.epub')
+
+    def test_record(self):
+        measures = []
+        stats = epub.stats.EpubStats(
+            callback=lambda name, measure: measures.append((name, measure)))
+        stats.record('read_item', time=0.5, bytes_read=10)
+        stats.record('read_item', time=0.25, bytes_read=5, hits=1)
+
+        self.assertEqual(stats.as_dict(), {
+            'read_item': {'calls': 2, 'time': 0.75, 'bytes_read': 15,
+                          'bytes_decompressed': 0, 'bytes_written': 0,
+                          'elements': 0, 'hits': 1}})
+        self.assertEqual([name for name, measure in measures],
+                         ['read_item', 'read_item'])
+        self.assertEqual(measures[1][1]['bytes_read'], 5)
+
+        stats.reset()
+        self.assertEqual(stats.as_dict(), {})
+
+    def test_stage(self):
+        stats = epub.stats.EpubStats()
+        with stats.stage('opf') as stage:
+            stage.add(elements=2)
+            stage.add(elements=3)
+        try:
+            with stats.stage('ncx'):
+                raise ValueError()
+        except ValueError:
+            pass
+
+        totals = stats.as_dict()
+        self.assertEqual(list(totals), ['opf'])
+        self.assertEqual(totals['opf']['elements'], 5)
+        self.assertGreaterEqual(totals['opf']['time'], 0)
+
+    def test_open_epub(self):
+        stats = epub.stats.EpubStats()
+        with epub.open_epub(self.epub_path, stats=stats) as book:
+            item = book.get_item('Section0002.xhtml')
+            book.read_item(item)
+            book.read_item(item)
+            info = book.getinfo('OEBPS/Text/Section0002.xhtml')
+            opf_info = book.getinfo(book.opf_path)
+            entries = len(book.infolist())
+            elements = len(book.opf.manifest) + len(book.opf.spine.itemrefs)
+
+        totals = stats.as_dict()
+        self.assertEqual(sorted(totals), ['central_directory', 'container',
+                                          'ncx', 'opf', 'read_item'])
+        self.assertEqual(totals['central_directory']['elements'], entries)
+        self.assertEqual(totals['opf']['bytes_read'], opf_info.compress_size)
+        self.assertEqual(totals['opf']['bytes_decompressed'],
+                         opf_info.file_size)
+        self.assertEqual(totals['opf']['elements'], elements)
+        self.assertGreaterEqual(totals['ncx']['elements'], 6)
+        self.assertEqual(totals['read_item']['calls'], 2)
+        self.assertEqual(totals['read_item']['bytes_decompressed'],
+                         2 * info.file_size)
+
+    def test_lazy_toc(self):
+        stats = epub.stats.EpubStats()
+        with epub.open_epub(self.epub_path, lazy_toc=True,
+                            stats=stats) as book:
+            self.assertNotIn('ncx', stats.as_dict())
+            book.toc
+        self.assertEqual(stats.as_dict()['ncx']['calls'], 1)
+
+    def test_cache(self):
+        directory = tempfile.mkdtemp()
+        try:
+            cache = epub.cache.ParseCache(directory)
+            stats = epub.stats.EpubStats()
+            for _ in range(2):
+                epub.open_epub(self.epub_path, cache=cache,
+                               stats=stats).close()
+
+            totals = stats.as_dict()
+            self.assertEqual(totals['cache']['misses'], 1)
+            self.assertEqual(totals['cache']['hits'], 1)
+            self.assertEqual(totals['opf']['calls'], 1)
+        finally:
+            rmtree(directory)
+
+    def test_write_close(self):
+        directory = tempfile.mkdtemp()
+        try:
+            stats = epub.stats.EpubStats()
+            path = os.path.join(directory, 'write.epub')
+            with epub.open_epub(path, 'w', stats=stats) as book:
+                book.add_item_stream(
+                    b'<html/>', epub.opf.ManifestItem(
+                        'page', 'page.xhtml', 'application/xhtml+xml'),
+                    append_to_spine=True)
+
+            totals = stats.as_dict()['write_close']
+            self.assertEqual(totals['calls'], 1)
+            self.assertGreater(totals['bytes_written'], 0)
+            # Manifest: ncx and page, spine: page
+            self.assertEqual(totals['elements'], 3)
+        finally:
+            rmtree(directory)
+
+    def test_disabled(self):
+        with epub.open_epub(self.epub_path) as book:
+            self.assertIsNone(book.stats)
+            self.assertIs(book._stage('opf'), epub.stats.NULL_STAGE)
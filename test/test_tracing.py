@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+import os
+import tempfile
+import threading
+import unittest
+import zipfile
+
+from shutil import copy, rmtree
+
+
+import epub
+import epub.cache
+import epub.tracing
+
+
+class TestTracer(unittest.TestCase):
+
+    def test_default(self):
+        tracer = epub.tracing.get_tracer()
+        self.assertIs(tracer.span('open book'), epub.tracing.NULL_SPAN)
+        with tracer.span('open book', {'epub.mode': 'r'}) as span:
+            span.set_attribute('epub.members', 1)
+
+    def test_set_tracer(self):
+        tracer = epub.tracing.RecordingTracer()
+        epub.tracing.set_tracer(tracer)
+        try:
+            self.assertIs(epub.tracing.get_tracer(), tracer)
+        finally:
+            epub.tracing.set_tracer(None)
+        self.assertIsNot(epub.tracing.get_tracer(), tracer)
+        self.assertIs(epub.tracing.get_tracer().span('open book'),
+                      epub.tracing.NULL_SPAN)
+
+    def test_recording_tracer(self):
+        tracer = epub.tracing.RecordingTracer()
+        with tracer.span('open book') as parent:
+            with tracer.span('read member', {'epub.member': 'a'}) as child:
+                child.set_attribute('epub.size', 2)
+        try:
+            with tracer.span('read member'):
+                raise KeyError('b')
+        except KeyError:
+            pass
+
+        # Other threads do not see the spans of this one
+        def run():
+            with tracer.span('decompress'):
+                pass
+        with tracer.span('open book'):
+            thread = threading.Thread(target=run)
+            thread.start()
+            thread.join()
+
+        child, parent, error, thread_span, _ = tracer.spans
+        self.assertIs(child.parent, parent)
+        self.assertIsNone(parent.parent)
+        self.assertEqual(child.attributes, {'epub.member': 'a',
+                                            'epub.size': 2})
+        self.assertGreaterEqual(child.duration, 0)
+        self.assertEqual(error.attributes['error'], repr(KeyError('b')))
+        self.assertEqual(thread_span.name, 'decompress')
+        self.assertIsNone(thread_span.parent)
+
+
+class TestEpubTracing(unittest.TestCase):
+    epub_path = os.path.join(os.path.dirname(__file__), '_data/test.epub')
+
+    def setUp(self):
+        self.tracer = epub.tracing.RecordingTracer()
+
+    def spans(self, name):
+        return [span for span in self.tracer.spans if span.name == name]
+
+    def test_open_epub(self):
+        with epub.open_epub(self.epub_path, tracer=self.tracer) as book:
+            members = len(book.infolist())
+            item = book.get_item('Section0002.xhtml')
+            info = book.getinfo('OEBPS/Text/Section0002.xhtml')
+            self.assertEqual(book.read_item(item),
+                             book.read('OEBPS/Text/Section0002.xhtml'))
+
+        open_book, = self.spans('open book')
+        self.assertEqual(open_book.attributes, {
+            'epub.filename': self.epub_path, 'epub.mode': 'r',
+            'epub.members': members})
+
+        read_member, = self.spans('read member')
+        self.assertIsNone(read_member.parent)
+        self.assertEqual(read_member.attributes, {
+            'epub.member': 'OEBPS/Text/Section0002.xhtml',
+            'epub.compressed_size': info.compress_size,
+            'epub.size': info.file_size})
+
+        if info.compress_type == zipfile.ZIP_DEFLATED:
+            decompress, = self.spans('decompress')
+            self.assertIs(decompress.parent, read_member)
+
+    def test_cache(self):
+        directory = tempfile.mkdtemp()
+        try:
+            cache = epub.cache.ParseCache(directory)
+            for _ in range(2):
+                epub.open_epub(self.epub_path, cache=cache,
+                               tracer=self.tracer).close()
+        finally:
+            rmtree(directory)
+
+        self.assertEqual([span.attributes['epub.cache']
+                          for span in self.spans('open book')],
+                         ['miss', 'hit'])
+
+    def test_book(self):
+        with epub.open_epub(self.epub_path, tracer=self.tracer) as epub_file:
+            book = epub.Book(epub_file)
+            chapters = book.chapters
+            chapters[0].read()
+
+        resolve, = self.spans('resolve chapter')
+        self.assertEqual(resolve.attributes['epub.chapters'], len(chapters))
+        read_chapter, = self.spans('read chapter')
+        self.assertEqual(read_chapter.attributes['epub.chapter'],
+                         chapters[0].identifier)
+        read_member, = self.spans('read member')
+        self.assertIs(read_member.parent, read_chapter)
+
+    def test_read_deflated(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'deflated.epub')
+            copy(self.epub_path, path)
+            content = b'<html>' + b'<p>text</p>' * 1000 + b'</html>'
+            with zipfile.ZipFile(path, 'a', zipfile.ZIP_DEFLATED) as archive:
+                archive.writestr('OEBPS/Text/deflated.xhtml', content)
+
+            with epub.open_epub(path, tracer=self.tracer) as book:
+                self.assertEqual(book.read_item('Text/deflated.xhtml'),
+                                 content)
+                # A corrupted CRC is still detected
+                book.getinfo('OEBPS/Text/deflated.xhtml').CRC ^= 1
+                self.assertRaises(zipfile.BadZipfile, book.read_item,
+                                  'Text/deflated.xhtml')
+        finally:
+            rmtree(directory)
+
+        decompress = self.spans('decompress')
+        self.assertEqual(len(decompress), 2)
+        self.assertEqual(decompress[0].attributes['epub.size'], len(content))
@@ -2,6 +2,7 @@
 from __future__ import unicode_literals
 
 
+import io
 import unittest
 import epub
 
@@ -32,3 +33,56 @@ class TestFunction(unittest.TestCase):
         href, fragment = epub.utils.get_urlpath_part(url)
         self.assertEquals(href, expected_href)
         self.assertEquals(fragment, expected_fragment)
+
+    def test_escape_xml_data(self):
+        self.assertEqual(epub.utils.escape_xml_data('a & <b> "c"'),
+                         'a &amp; &lt;b&gt; &quot;c&quot;')
+        self.assertEqual(epub.utils.escape_xml_data(None), '')
+
+    def test_xml_writer(self):
+        fp = io.BytesIO()
+        writer = epub.utils.XmlWriter(fp, buffer_size=8)
+        writer.declaration()
+        writer.start('root', [('id', 'é&')])
+        writer.element('empty')
+        writer.element('text', text='')
+        writer.element('text', [('lang', 'fr')], 'Métadonnée')
+        writer.end('root')
+        writer.flush()
+
+        doc = minidom.Document()
+        root = doc.createElement('root')
+        root.setAttribute('id', 'é&')
+        root.appendChild(doc.createElement('empty'))
+        text = doc.createElement('text')
+        text.appendChild(doc.createTextNode(''))
+        root.appendChild(text)
+        text = doc.createElement('text')
+        text.setAttribute('lang', 'fr')
+        text.appendChild(doc.createTextNode('Métadonnée'))
+        root.appendChild(text)
+        doc.appendChild(root)
+
+        self.assertEqual(fp.getvalue(), doc.toxml().encode('utf-8'))
+
+    def test_xml_writer_sort_attributes(self):
+        attributes = [('version', '2.0'), ('id', 'a')]
+        outputs = [(True, b'<root id="a" version="2.0"/>'),
+                   (False, b'<root version="2.0" id="a"/>')]
+        for sort_attributes, expected in outputs:
+            fp = io.BytesIO()
+            writer = epub.utils.XmlWriter(fp, sort_attributes=sort_attributes)
+            writer.element('root', attributes)
+            writer.flush()
+            self.assertEqual(fp.getvalue(), expected)
+
+        # The default is the order of xml.dom.minidom
+        doc = minidom.Document()
+        root = doc.createElement('root')
+        for name, value in attributes:
+            root.setAttribute(name, value)
+        fp = io.BytesIO()
+        writer = epub.utils.XmlWriter(fp)
+        writer.element('root', attributes)
+        writer.flush()
+        self.assertEqual(fp.getvalue(), root.toxml().encode('utf-8'))